@@ -7,8 +7,8 @@ to a playing pipeline.
 This particular example uses videotestsrc elements and a compositor to display the source four times
 '''
 
+import json
 import sys
-import random
 
 import gi
 gi.require_version('Gst', '1.0')
@@ -16,44 +16,47 @@ gi.require_version('GLib', '2.0')
 gi.require_version('GObject', '2.0')
 from gi.repository import GLib, GObject, Gst
 
+from busmonitor import BusMonitor
+from standby import StandbyPool
+
+from layout import GRID, LayoutEngine, layout_tiles
+from live import DeadlineMonitor, configure_live
+
+# Caps every standby source is pinned to, videotestsrc's own default size and rate
+STANDBY_CAPS = 'video/x-raw,format=I420,width=320,height=240,framerate=30/1'
+
+
+# Create an initial source pinned to STANDBY_CAPS like the standby ones, so the
+# first swap links a source with the caps the compositor pad already has
+def make_source(live=False):
+    return Gst.parse_bin_from_description(
+        f'videotestsrc is-live={str(live).lower()} ! capsfilter caps={STANDBY_CAPS}', True)
+
 
 # Define a class to hold data for dynamic source management
 class ProbeData:
-    def __init__(self, pipe, src):
+    def __init__(self, pipe, src, pool):
         self.pipe = pipe
         self.src = src
+        self.pool = pool
 
-# Callback function to handle bus messages
-def bus_call(bus, message, loop):
-    t = message.type
-    if t == Gst.MessageType.EOS:
-        sys.stdout.write("End-of-stream\n")
-        loop.quit()
-    elif t == Gst.MessageType.ERROR:
-        err, debug = message.parse_error()
-        sys.stderr.write("Error: %s: %s\n" % (err, debug))
-        loop.quit()
-    return True
-
-# Callback function to dispose of the source element
-def dispose_src_cb(src):
-    src.set_state(Gst.State.NULL)
+# Callback functions for the bus messages that stop the loop
+def eos_cb(loop):
+    sys.stdout.write("End-of-stream\n")
+    loop.quit()
 
+def error_cb(err, debug, loop):
+    sys.stderr.write("Error: %s: %s\n" % (err, debug))
+    loop.quit()
 
 # Callback function for pad probe
 def probe_cb(pad, info, pdata):
     peer = pad.get_peer()
     pad.unlink(peer)
-    pdata.pipe.remove(pdata.src)
-    # Can't set the state of the src to NULL from its streaming thread
-    GLib.idle_add(dispose_src_cb, pdata.src)
 
-    pdata.src = Gst.ElementFactory.make('videotestsrc')
-    pdata.src.props.pattern = random.randint(0, 24)
-    pdata.pipe.add(pdata.src)
-    srcpad = pdata.src.get_static_pad ("src")
-    srcpad.link(peer)
-    pdata.src.sync_state_with_parent()
+    # Swap in a standby source that is already negotiated and holding its first
+    # frame, the old one goes back to the pool or is disposed of from the main loop
+    pdata.src = pdata.pool.swap(pdata.src, peer)
 
     GLib.timeout_add_seconds(1, timeout_cb, pdata)
 
@@ -66,6 +69,11 @@ def timeout_cb(pdata):
 
     return GLib.SOURCE_REMOVE
 
+# Callback function to report the pads that missed the compositor deadline
+def deadline_cb(deadlines):
+    sys.stdout.write("Deadlines: %s\n" % json.dumps(deadlines.snapshot()))
+    return GLib.SOURCE_CONTINUE
+
 # Main function
 def main(args):
     Gst.init(None)
@@ -75,10 +83,16 @@ def main(args):
 
     # Create pipeline and elements
     pipe = Gst.Pipeline.new('dynamic')
-    srcs = [Gst.ElementFactory.make('videotestsrc') for _ in range(4)]
+    srcs = [make_source(live=True) for _ in range(4)]
     compositor = Gst.ElementFactory.make('compositor')
     sink = Gst.ElementFactory.make('autovideosink')
 
+    # Live room: the sources are live and the compositor composes every 40 ms at
+    # the latest, reusing the last frame of a source that is late
+    live_latency_ms = 40
+    configure_live(compositor, live_latency_ms)
+    deadlines = DeadlineMonitor(compositor)
+
     # Add elements to the pipeline
     [pipe.add(src) for src in srcs]  
     pipe.add(compositor)
@@ -86,13 +100,11 @@ def main(args):
 
     # Request pads from the compositor
     pads = [compositor.get_request_pad(f'sink_{i}') for i in range(4)]
+    [deadlines.add_pad(pad) for pad in pads]
 
     # Set properties for the pads to control the layout
-    pad_properties = [(0, 0), (320, 0), (0, 320), (320, 320)]
-    [pads[i].set_property('xpos', x) for i, (x, _) in enumerate(pad_properties)]
-    [pads[i].set_property('ypos', y) for i, (_, y) in enumerate(pad_properties)]
-    [pad.set_property('width', 320) for pad in pads]
-    [pad.set_property('height', 320) for pad in pads]
+    layout = LayoutEngine(compositor)
+    layout.apply(zip(pads, layout_tiles(GRID, 4, 640, 640)))
     
 
     # Get the source pads
@@ -107,16 +119,23 @@ def main(args):
     # Link the compositor to the sink
     compositor.link(sink)
 
+    # Pre-warm standby sources so swaps don't create elements in the pad probe
+    pool = StandbyPool(pipe, STANDBY_CAPS, size=len(srcs), live=True)
+    pool.fill()
+
     # Initialize ProbeData objects for dynamic source management
-    pdata = [ProbeData(pipe, src) for src in srcs]
+    pdata = [ProbeData(pipe, src, pool) for src in srcs]
 
     # Add timeout callbacks for dynamic source management
     [GLib.timeout_add_seconds(20, timeout_cb, data) for data in pdata]
 
-    # Setup bus to handle messages
-    bus = pipe.get_bus()
-    bus.add_signal_watch()
-    bus.connect ("message", bus_call, loop)
+    # Report missed deadlines every 10 seconds
+    GLib.timeout_add_seconds(10, deadline_cb, deadlines)
+
+    # Setup bus to handle messages, only the message types the monitor tracks reach Python
+    bus_monitor = BusMonitor(pipe, on_eos=lambda: eos_cb(loop),
+                             on_error=lambda err, debug: error_cb(err, debug, loop))
+    bus_monitor.start()
     
     # Start playback and listen to events
     pipe.set_state(Gst.State.PLAYING)
@@ -7,8 +7,21 @@ This script creates a GStreamer pipeline that dynamically adds and removes video
 (simulating participants) arranged in a grid using the compositor element.
 
 Usage:
-- Change the number of columns in the grid: Modify the 'num_cols' variable in the add_video_source function.
+- Change the layout: Modify the 'layout_kind' argument of the Room in the main function (grid, speaker or pip).
+  The grid picks its number of columns from the participant count, pass 'num_cols' to the Room to fix it.
 - Change the total number of participants: Modify the 'total_participants' variable in the main function.
+- Change the latency budget of the live room: Modify the 'live_latency_ms' variable in the main function.
+- Change the output size: Modify the 'canvas' variable in the main function, the grid scales to fit inside it.
+- Composite large rooms on several cores: Set the 'groups' variable in the main function to the number of
+  sub-compositors, e.g. 4 for 36-64 participants.
+- Show only part of a large room: Set the 'page_size' variable in the main function, participants off the
+  visible page are parked and the pages flip every 15 seconds.
+- Save CPU on small tiles: Set the 'inactive_fps' variable in the main function, e.g. 10, to cap everyone
+  but the active speaker (the main tile in the speaker and pip layouts) to that framerate.
+- Record or stream the output: Set the 'record_to' variable in the main function to a file name and/or the
+  'rtp_port' variable to a localhost UDP port. Every output gets its own leaky queue next to the preview.
+- Record in segments: Set the 'record_segments' variable in the main function to a file pattern such as
+  'room-%05d.mp4'. Recording starts after 20 seconds and stops after 80, while the room keeps playing.
 
 Requirements:
 - GStreamer and the necessary Python bindings (gi.repository) must be installed.
@@ -17,89 +30,68 @@ Requirements:
 
 import sys
 import gi
+import json
 import logging
-import random
 gi.require_version('Gst', '1.0')
 gi.require_version('GLib', '2.0')
 gi.require_version('GObject', '2.0')
 from gi.repository import GLib, GObject, Gst
 
+from busmonitor import BusMonitor
+from layout import GRID
+from output import OutputStage
+from recording import SegmentedRecording
+from room import Room
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("main")
 
 compositor = None
-sink = None
+monitor = None
+output = None
 pipeline = None
-participants = []
-
-def get_source(participant_num):
-    """Create and return a videotestsrc element for a participant."""
-    return Gst.ElementFactory.make("videotestsrc", f'src+{participant_num}')
-
-def get_sink():
-    """Create and return an autovideosink element for the final output."""
-    return Gst.ElementFactory.make("autovideosink", "autovideosink")
+room = None
 
 def get_compositor():
     """Create and return a compositor element for arranging video sources."""
     return Gst.ElementFactory.make("compositor", "compositor")
 
 def add_video_source(participant_num):
-    """Add a video source (participant) to the pipeline."""
+    """Add a video source (participant) to the playing pipeline."""
     log.info(f"Adding videotestsrc for participant {participant_num}")
-    src = get_source(participant_num)
-    pipeline.add(src)
-    participants.append(src)
-
-    num_cols = 4  # Number of columns in the grid
-    row = participant_num // num_cols
-    col = participant_num % num_cols
-
-    # Request a sink pad from the compositor and set its properties
-    pad = compositor.get_request_pad(f'sink_{participant_num}')
-    pad.set_property('xpos', 320 * col)
-    pad.set_property('ypos', 320 * row)
-    pad.set_property('width', 320)
-    pad.set_property('height', 320)
-
-    # Link the source pad to the requested sink pad on the compositor
-    srcpad = src.get_static_pad("src")
-    srcpad.link(pad)
-
-    # Link the source to the compositor
-    src.link(compositor)
-
-    # Set the pipeline to PLAYING state
-    pipeline.set_state(Gst.State.PLAYING)
+    room.add_participant(participant_num)
 
 def remove_sink_pad():
     """Remove a random participant's sink pad from the compositor."""
-    if participants:
-        participant_to_remove = random.choice(participants)
-        participants.remove(participant_to_remove)
-
-        # Get the participant number from the source name
-        participant_num = int(participant_to_remove.get_name().split('+')[-1])
-
-        print(f"Removing participant {participant_num}")
-
-        # Release the request pad from the compositor
-        remove_pad = compositor.get_static_pad(f'sink_{participant_num}')
-        compositor.release_request_pad(remove_pad)
-
-        # Re-adjust the positions of the remaining participants on the grid
-        for i, participant in enumerate(participants):
-            participant_num = int(participant.get_name().split('+')[-1])
-            num_cols = 4
-            row = i // num_cols
-            col = i % num_cols
-
-            pad = compositor.get_static_pad(f'sink_{participant_num}')
-            pad.set_property('xpos', 320 * col)
-            pad.set_property('ypos', 320 * row)
-
-        # Set the pipeline to PLAYING state
-        pipeline.set_state(Gst.State.PLAYING)
+    participant_num = room.participants.random_id()
+    if participant_num is None:
+        return
+
+    print(f"Removing participant {participant_num}")
+    # The remaining participants are re-laid out on the grid once the pad is released
+    room.remove_participant(participant_num)
+
+def next_page():
+    """Show the next page of participants, wrapping around to the first one."""
+    pages = max(len(room.participants) - 1, 0) // room.page_size + 1
+    room.set_page((room.page + 1) % pages)
+    return GLib.SOURCE_CONTINUE
+
+def log_stats():
+    """Log the room statistics: join/leave latency, queue levels and per-participant latency."""
+    stats = room.stats()
+    stats['outputs'] = output.stats()
+    stats['bus'] = monitor.snapshot()
+    log.info(json.dumps(stats))
+    return GLib.SOURCE_CONTINUE
+
+def toggle_recording(recording):
+    """Start the segmented recording, or stop it if it is running."""
+    if recording.recording:
+        recording.stop()
+    else:
+        recording.start()
+    return GLib.SOURCE_REMOVE
 
 def add_participants(total_participants, current_participant):
     """Add participants to the pipeline at intervals."""
@@ -111,7 +103,7 @@ def add_participants(total_participants, current_participant):
         GLib.timeout_add_seconds(1, add_participants, total_participants, current_participant)
 
 def main(args):
-    global compositor, sink, pipeline
+    global compositor, monitor, output, pipeline, room
 
     # Initialize GObject threads and GStreamer
     GObject.threads_init()
@@ -121,12 +113,36 @@ def main(args):
     pipeline = Gst.Pipeline.new("dynamic")
     loop = GObject.MainLoop()
 
-    # Create compositor and sink elements and add them to the pipeline
+    # Create the compositor and add it to the pipeline
     compositor = get_compositor()
     pipeline.add(compositor)
-
-    sink = get_sink()
-    pipeline.add(sink)
+    # Live room: compose every 40 ms at the latest instead of waiting for late participants
+    live_latency_ms = 40
+    # Fixed 1280x720 output, the grid scales to fit so joins never change the output caps
+    canvas = (1280, 720)
+    # Number of sub-compositors for cascaded compositing, None mixes all participants at once
+    groups = None
+    # Number of visible participants per page, None shows everyone
+    page_size = None
+    # Framerate cap of the non-active participants, None runs everyone at full rate
+    inactive_fps = None
+    room = Room(pipeline, compositor, instrument=True, queue=True,
+                live_latency_ms=live_latency_ms, canvas=canvas, layout_kind=GRID,
+                groups=groups, page_size=page_size, inactive_fps=inactive_fps)
+
+    # The composited frame is shared by the preview and the optional recording and RTP outputs
+    output = OutputStage(pipeline)
+    output.add_preview()
+    # File to record the output to, None doesn't record
+    record_to = None
+    if record_to:
+        output.add_recording(record_to)
+    # Localhost UDP port to stream the output to as RTP, None doesn't stream
+    rtp_port = None
+    if rtp_port:
+        output.add_rtp(port=rtp_port)
+    # File pattern of one-minute recording segments, None doesn't record segments
+    record_segments = None
 
     # Set the number of participants to be added
     total_participants = 9
@@ -135,12 +151,29 @@ def main(args):
     # Add participants to the pipeline
     add_participants(total_participants, current_participant)
 
-    # Link the compositor to the sink
-    compositor.link(sink)
+    # Link the compositor to the outputs through the fixed canvas caps
+    compositor.link_filtered(output.tee, room.output_caps())
 
     # Set the pipeline to PLAYING state
     pipeline.set_state(Gst.State.PLAYING)
 
+    # Flip through the pages of a paginated room
+    if page_size:
+        GLib.timeout_add_seconds(15, next_page)
+
+    # Start and stop the segmented recording without pausing the pipeline
+    if record_segments:
+        recording = SegmentedRecording(output, record_segments, max_time_s=60)
+        GLib.timeout_add_seconds(20, toggle_recording, recording)
+        GLib.timeout_add_seconds(80, toggle_recording, recording)
+
+    # A participant whose branch fails is evicted, the rest of the room keeps playing
+    monitor = BusMonitor(pipeline, room, on_error=lambda err, debug: loop.quit())
+    monitor.start()
+
+    # Log the room statistics every 10 seconds
+    GLib.timeout_add_seconds(10, log_stats)
+
     # Schedule removing a participant randomly every 25 seconds
     GLib.timeout_add_seconds(25, remove_sink_pad)
 
@@ -8,7 +8,6 @@ This particular example uses videotestsrc elements and a compositor to display t
 '''
 
 import sys
-import random
 
 import gi
 gi.require_version('Gst', '1.0')
@@ -16,43 +15,44 @@ gi.require_version('GLib', '2.0')
 gi.require_version('GObject', '2.0')
 from gi.repository import GLib, GObject, Gst
 
+from busmonitor import BusMonitor
+from standby import StandbyPool
+
+# Caps every standby source is pinned to, videotestsrc's own default size and rate
+STANDBY_CAPS = 'video/x-raw,format=I420,width=320,height=240,framerate=30/1'
+
+
+# Create an initial source pinned to STANDBY_CAPS like the standby ones, so the
+# first swap links a source with the caps the compositor pad already has
+def make_source(live=False):
+    return Gst.parse_bin_from_description(
+        f'videotestsrc is-live={str(live).lower()} ! capsfilter caps={STANDBY_CAPS}', True)
+
 
 # Define a class to hold data for dynamic source management
 class ProbeData:
-    def __init__(self, pipe, src):
+    def __init__(self, pipe, src, pool):
         self.pipe = pipe
         self.src = src
+        self.pool = pool
+
+# Callback functions for the bus messages that stop the loop
+def eos_cb(loop):
+    sys.stdout.write("End-of-stream\n")
+    loop.quit()
 
-# Callback function to handle bus messages
-def bus_call(bus, message, loop):
-    t = message.type
-    if t == Gst.MessageType.EOS:
-        sys.stdout.write("End-of-stream\n")
-        loop.quit()
-    elif t == Gst.MessageType.ERROR:
-        err, debug = message.parse_error()
-        sys.stderr.write("Error: %s: %s\n" % (err, debug))
-        loop.quit()
-    return True
-
-# Callback function to dispose of the source element
-def dispose_src_cb(src):
-    src.set_state(Gst.State.NULL)
+def error_cb(err, debug, loop):
+    sys.stderr.write("Error: %s: %s\n" % (err, debug))
+    loop.quit()
 
 # Callback function for pad probe
 def probe_cb(pad, info, pdata):
     peer = pad.get_peer()
     pad.unlink(peer)
-    pdata.pipe.remove(pdata.src)
-    # Can't set the state of the src to NULL from its streaming thread
-    GLib.idle_add(dispose_src_cb, pdata.src)
 
-    pdata.src = Gst.ElementFactory.make('videotestsrc')
-    pdata.src.props.pattern = random.randint(0, 24)
-    pdata.pipe.add(pdata.src)
-    srcpad = pdata.src.get_static_pad ("src")
-    srcpad.link(peer)
-    pdata.src.sync_state_with_parent()
+    # Swap in a standby source that is already negotiated and holding its first
+    # frame, the old one goes back to the pool or is disposed of from the main loop
+    pdata.src = pdata.pool.swap(pdata.src, peer)
 
     GLib.timeout_add_seconds(1, timeout_cb, pdata)
 
@@ -70,8 +70,8 @@ def main(args):
 
     # Create pipeline and elements
     pipe = Gst.Pipeline.new('dynamic')
-    src1 = Gst.ElementFactory.make('videotestsrc')
-    src2 = Gst.ElementFactory.make('videotestsrc')
+    src1 = make_source()
+    src2 = make_source()
     compositor = Gst.ElementFactory.make('compositor')
     sink = Gst.ElementFactory.make('autovideosink')
     
@@ -107,9 +107,13 @@ def main(args):
     # Link the compositor to the sink
     compositor.link(sink)
 
+    # Pre-warm standby sources so swaps don't create elements in the pad probe
+    pool = StandbyPool(pipe, STANDBY_CAPS, size=2)
+    pool.fill()
+
     # Initialize ProbeData objects for dynamic source management
-    pdata1 = ProbeData(pipe, src1)
-    pdata2 = ProbeData(pipe, src2)
+    pdata1 = ProbeData(pipe, src1, pool)
+    pdata2 = ProbeData(pipe, src2, pool)
 
     # Create a main loop
     loop = GObject.MainLoop()
@@ -118,10 +122,10 @@ def main(args):
     GLib.timeout_add_seconds(20, timeout_cb, pdata1)
     GLib.timeout_add_seconds(20, timeout_cb, pdata2)
 
-    # Setup bus to handle messages
-    bus = pipe.get_bus()
-    bus.add_signal_watch()
-    bus.connect ("message", bus_call, loop)
+    # Setup bus to handle messages, only the message types the monitor tracks reach Python
+    monitor = BusMonitor(pipe, on_eos=lambda: eos_cb(loop),
+                         on_error=lambda err, debug: error_cb(err, debug, loop))
+    monitor.start()
     
     # Start playback and listen to events
     pipe.set_state(Gst.State.PLAYING)
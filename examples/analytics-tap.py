@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Per-participant analytics next to the mixer, on frames tapped into NumPy.
+
+This script runs a room of four participants and taps every participant at a
+low sampling rate in grayscale. For each sampled frame it computes the mean
+brightness (black-frame detection) and the mean difference to the previous
+sample (motion), and logs them together with the tap statistics every 10
+seconds. The frames are views of the GStreamer buffers, nothing is copied
+except the small previous sample kept for the motion estimate.
+
+Usage:
+- Change the sampling rate: Modify the 'sample_fps' variable in the main function.
+
+Requirements:
+- GStreamer and the necessary Python bindings (gi.repository) must be installed.
+- NumPy must be installed.
+
+"""
+
+import json
+import logging
+import sys
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+from room import Room
+from tap import FrameTap
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("main")
+
+# Mean brightness below which a frame counts as black
+BLACK_LEVEL = 16
+
+class FrameAnalytics:
+    """Black-frame and motion estimates of one participant."""
+
+    def __init__(self, participant_id):
+        self.participant_id = participant_id
+        self.black_frames = 0
+        self.motion = None
+        self._previous = None
+
+    def __call__(self, frame, pts):
+        # Every 4th pixel in both directions is plenty for these estimates
+        small = frame[::4, ::4, 0]
+        if small.mean() < BLACK_LEVEL:
+            self.black_frames += 1
+        if self._previous is not None and self._previous.shape == small.shape:
+            self.motion = round(float(abs(small.astype('int16') - self._previous).mean()), 2)
+        # The frame is only valid during the callback, keep a copy of the sample
+        self._previous = small.astype('int16')
+
+def log_analytics(analytics, taps):
+    log.info(json.dumps({str(a.participant_id): dict(tap.stats(), black_frames=a.black_frames,
+                                                     motion=a.motion)
+                         for a, tap in zip(analytics, taps)}))
+    return GLib.SOURCE_CONTINUE
+
+def main(args):
+    Gst.init(None)
+
+    pipeline = Gst.Pipeline.new("analytics")
+    compositor = Gst.ElementFactory.make("compositor", "compositor")
+    sink = Gst.ElementFactory.make("autovideosink", "autovideosink")
+    pipeline.add(compositor)
+    pipeline.add(sink)
+
+    room = Room(pipeline, compositor, canvas=(1280, 720), live_latency_ms=40, tappable=True)
+    compositor.link_filtered(sink, room.output_caps())
+    pipeline.set_state(Gst.State.PLAYING)
+
+    # Frames per second handed to the analytics, per participant
+    sample_fps = 2
+    analytics, taps = [], []
+    for i in range(4):
+        room.add_participant(i)
+        analytics.append(FrameAnalytics(i))
+        taps.append(FrameTap(f'analytics{i}', analytics[-1], fps=sample_fps, format='GRAY8'))
+        room.tap(i, taps[-1])
+
+    GLib.timeout_add_seconds(10, log_analytics, analytics, taps)
+
+    loop = GLib.MainLoop()
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+
+    # Cleanup: Set the pipeline to NULL state
+    pipeline.set_state(Gst.State.NULL)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Participants driven from asyncio instead of chained GLib timeouts.
+
+This script lets a burst of participants join a fixed-size grid at once, then
+removes and adds participants from a plain asyncio coroutine. The commands are
+coalesced by control.py, so the join storm is linked and laid out in a single
+pass.
+
+Usage:
+- Change the size of the join storm: Modify the 'storm_size' variable in the main function.
+- Change the coalescing window: Modify the 'window_ms' and 'max_wait_ms' arguments of the AsyncRoom in the main function.
+
+Requirements:
+- GStreamer and the necessary Python bindings (gi.repository) must be installed.
+
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from control import AsyncRoom, run
+from layout import SPEAKER
+from room import Room
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("main")
+
+async def drive(room, storm_size):
+    """Join storm, churn and a layout change, all awaited in order."""
+    # All joins land in the same coalescing window
+    await asyncio.gather(*(room.add(i) for i in range(storm_size)))
+    log.info(json.dumps(await room.stats()))
+
+    await asyncio.sleep(5)
+    await asyncio.gather(room.remove(0), room.remove(1), room.add(storm_size))
+
+    await asyncio.sleep(5)
+    await room.set_layout(SPEAKER)
+    await room.set_speaker(storm_size)
+
+    await asyncio.sleep(10)
+    log.info(json.dumps(await room.stats()))
+
+def main(args):
+    Gst.init(None)
+
+    pipeline = Gst.Pipeline.new("async")
+    compositor = Gst.ElementFactory.make("compositor", "compositor")
+    sink = Gst.ElementFactory.make("autovideosink", "autovideosink")
+    pipeline.add(compositor)
+    pipeline.add(sink)
+
+    room = Room(pipeline, compositor, live_latency_ms=40, canvas=(1280, 720))
+    compositor.link_filtered(sink, room.output_caps())
+    pipeline.set_state(Gst.State.PLAYING)
+
+    # Number of participants joining at once
+    storm_size = 20
+    try:
+        run(drive(AsyncRoom(room, window_ms=20, max_wait_ms=150), storm_size))
+    except KeyboardInterrupt:
+        pass
+
+    # Cleanup: Set the pipeline to NULL state
+    pipeline.set_state(Gst.State.NULL)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
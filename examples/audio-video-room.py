@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Participants with audio and video joining and leaving a playing room.
+
+This script mixes the video of every participant with a compositor and its
+audio with an audiomixer. Participants join one by one, one of them is muted,
+and a random participant leaves every 20 seconds, taking its audio and video
+branch with it. Every 5 seconds another participant "talks" louder than the
+others, and the speaker selector gives it the main tile of the speaker
+layout. The audio/video drift and the mixer latency are logged every 10
+seconds.
+
+Usage:
+- Change the total number of participants: Modify the 'total_participants' variable in the main function.
+
+Requirements:
+- GStreamer and the necessary Python bindings (gi.repository) must be installed.
+
+"""
+
+import json
+import logging
+import sys
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+from layout import SPEAKER
+from room import Room
+from speaker import SpeakerSelector
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("main")
+
+def add_participants(room, total_participants, current_participant=0):
+    """Add a participant every second until the room is full."""
+    room.add_participant(current_participant)
+    if current_participant + 1 < total_participants:
+        GLib.timeout_add_seconds(1, add_participants, room, total_participants,
+                                 current_participant + 1)
+    return GLib.SOURCE_REMOVE
+
+def adjust_audio(room):
+    """Mute the first participant."""
+    if 0 in room.participants:
+        room.set_mute(0, True)
+    return GLib.SOURCE_REMOVE
+
+def talk(room):
+    """Let a random participant talk, the others only make background noise."""
+    talker = room.participants.random_id()
+    for participant in room.participants:
+        if participant.id != 0:
+            room.set_volume(participant.id, 1.0 if participant.id == talker else 0.05)
+    return GLib.SOURCE_CONTINUE
+
+def remove_participant(room):
+    """Remove a random participant, audio and video together."""
+    participant_id = room.participants.random_id()
+    if participant_id is not None:
+        room.remove_participant(participant_id)
+    return GLib.SOURCE_CONTINUE
+
+def log_stats(room):
+    log.info(json.dumps(room.stats()))
+    return GLib.SOURCE_CONTINUE
+
+def main(args):
+    Gst.init(None)
+
+    pipeline = Gst.Pipeline.new("audio-video")
+    compositor = Gst.ElementFactory.make("compositor", "compositor")
+    videosink = Gst.ElementFactory.make("autovideosink", "autovideosink")
+    audiomixer = Gst.ElementFactory.make("audiomixer", "audiomixer")
+    audiosink = Gst.ElementFactory.make("autoaudiosink", "autoaudiosink")
+    for element in (compositor, videosink, audiomixer, audiosink):
+        pipeline.add(element)
+
+    room = Room(pipeline, compositor, live_latency_ms=40, canvas=(1280, 720),
+                layout_kind=SPEAKER, audiomixer=audiomixer)
+    compositor.link_filtered(videosink, room.output_caps())
+    audiomixer.link(audiosink)
+    pipeline.set_state(Gst.State.PLAYING)
+
+    # Set the number of participants to be added
+    total_participants = 6
+    add_participants(room, total_participants)
+
+    GLib.timeout_add_seconds(total_participants + 2, adjust_audio, room)
+    GLib.timeout_add_seconds(5, talk, room)
+
+    # Promote whoever talks to the main tile, decided twice a second from the level messages
+    selector = SpeakerSelector(room, interval_ms=500)
+    selector.start()
+    GLib.timeout_add_seconds(10, log_stats, room)
+    GLib.timeout_add_seconds(20, remove_participant, room)
+
+    loop = GLib.MainLoop()
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+
+    # Cleanup: Set the pipeline to NULL state
+    pipeline.set_state(Gst.State.NULL)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
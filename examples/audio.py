@@ -0,0 +1,128 @@
+"""
+Per-participant audio, mixed by an audiomixer next to the video compositor.
+
+An `AudioBranch` is the audio counterpart of `ParticipantBranch`: the
+participant's audio source in a bin with a `volume` element for per-participant
+volume and mute and a `level` element that measures the participant's
+loudness in the pipeline. `level` posts its RMS and peak values as `level`
+element messages on the bus every `level_interval_ms`, so active-speaker
+detection never runs Python per audio buffer; `parse_level()` reads them.
+
+The room links audio branches to the audiomixer and tears them down together
+with the video branches (see room.py).
+
+`AVSyncMonitor` keeps lip-sync visible under churn. When a snapshot is taken,
+e.g. by the room's stats timer, it queries the position of each participant's
+audio and video branch and of the two mixer outputs, converts them to running
+time and reports how far audio runs ahead of video, together with the latency
+the audiomixer reports. Nothing runs per buffer, the cost follows the stats
+interval rather than the room size.
+"""
+
+import logging
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from common import to_running_time
+
+log = logging.getLogger("audio")
+
+# Default interval of the level messages
+LEVEL_INTERVAL_MS = 100
+
+
+def make_audio_source(participant_id):
+    """Create the default participant audio source, a live audiotestsrc tone."""
+    src = Gst.ElementFactory.make('audiotestsrc', f'asrc+{participant_id}')
+    src.set_property('is-live', True)
+    # A different pitch per participant, so they can be told apart by ear
+    src.set_property('freq', 220.0 * 2 ** ((hash(participant_id) % 24) / 12))
+    src.set_property('volume', 0.2)
+    return src
+
+
+def parse_level(message):
+    """Return the loudest channel's (rms, peak) in dB of a level message, or None."""
+    structure = message.get_structure()
+    if structure is None or structure.get_name() != 'level':
+        return None
+    # GValueArrays of one value per channel
+    rms = structure.get_value('rms')
+    peak = structure.get_value('peak')
+    return max(rms), max(peak)
+
+
+class AudioBranch:
+    """The elements between a participant's audio source and its audiomixer pad."""
+
+    def __init__(self, participant_id, src, level_interval_ms=LEVEL_INTERVAL_MS):
+        self.src = src
+        self.bin = Gst.Bin.new(f'audio+{participant_id}')
+        self.muted = False
+        self.volume = Gst.ElementFactory.make('volume', f'volume+{participant_id}')
+        self.level = Gst.ElementFactory.make('level', f'level+{participant_id}')
+        self.level.set_property('interval', level_interval_ms * Gst.MSECOND)
+        self.level.set_property('post-messages', True)
+
+        elements = [src,
+                    Gst.ElementFactory.make('audioconvert', f'aconvert+{participant_id}'),
+                    Gst.ElementFactory.make('audioresample', f'aresample+{participant_id}'),
+                    self.volume, self.level]
+        for element in elements:
+            self.bin.add(element)
+        for upstream, downstream in zip(elements, elements[1:]):
+            upstream.link(downstream)
+        self.bin.add_pad(Gst.GhostPad.new('src', self.level.get_static_pad('src')))
+
+    def set_volume(self, volume):
+        """Set the linear volume, 1.0 is unchanged."""
+        self.volume.set_property('volume', volume)
+
+    def set_mute(self, muted):
+        """Mute or unmute the participant, a muted participant measures as silent."""
+        self.muted = muted
+        self.volume.set_property('mute', muted)
+
+
+class AVSyncMonitor:
+    """Audio/video drift per participant and between the mixers, and mixer latency."""
+
+    def __init__(self, compositor, audiomixer):
+        self.audiomixer = audiomixer
+        self._pads = {}  # name -> (video pad, audio pad)
+        self.add_pads(None, compositor.get_static_pad('src'), audiomixer.get_static_pad('src'))
+
+    def add_pads(self, name, video_pad, audio_pad):
+        """Start comparing the positions of two pads, reported under `name`."""
+        self._pads[name] = (video_pad, audio_pad)
+
+    def remove_pads(self, name):
+        """Stop comparing the pads added under `name`."""
+        self._pads.pop(name, None)
+
+    def snapshot(self):
+        """Return audio minus video running time in ms, and the audiomixer latency."""
+        def drift(name):
+            video_pad, audio_pad = self._pads[name]
+            video, audio = _position(video_pad), _position(audio_pad)
+            if video is None or audio is None:
+                return None
+            return round((audio - video) / Gst.MSECOND, 1)
+
+        snapshot = {
+            'output_drift_ms': drift(None),
+            'drift_ms': {str(name): drift(name) for name in self._pads if name is not None},
+        }
+        query = Gst.Query.new_latency()
+        if self.audiomixer.get_static_pad('src').query(query):
+            live, min_latency, _ = query.parse_latency()
+            snapshot['mixer_latency_ms'] = round(min_latency / Gst.MSECOND, 1)
+        return snapshot
+
+
+def _position(pad):
+    # The current position of the stream through a pad, as running time
+    ok, position = pad.query_position(Gst.Format.TIME)
+    return to_running_time(pad, position) if ok else None
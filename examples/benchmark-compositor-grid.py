@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+"""
+Headless throughput benchmark for the compositor grid.
+
+This script builds the same grid as add-sources-and-sinks-in-sequence.py
+(videotestsrc participants laid out by a compositor, `num_cols` tiles per row),
+but replaces the display sink with `fakesink sync=false` so the pipeline runs
+as fast as the machine allows. After a warm-up period it measures, for a fixed
+window, the sustained output framerate, the CPU load per core and the peak RSS
+of the process, and prints the result as JSON.
+
+Usage:
+    python3 benchmark-compositor-grid.py --participants 16 --width 1280 --height 720 --framerate 30
+    python3 benchmark-compositor-grid.py --participants 1,4,9,16,36,64 > results.json
+
+When several participant counts are given, each one is measured in its own
+process so that peak RSS is not carried over from the previous run.
+
+Requirements:
+- GStreamer and the necessary Python bindings (gi.repository) must be installed.
+- CPU per core is read from /proc/stat and is only reported on Linux.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+MAX_PARTICIPANTS = 64
+
+
+def read_cpu_times():
+    """Return a list of (busy, total) jiffies per core, or None if unavailable."""
+    try:
+        with open('/proc/stat') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    cores = []
+    for line in lines:
+        # Skip the aggregated "cpu" line, keep "cpu0", "cpu1", ...
+        if not line.startswith('cpu') or line.startswith('cpu '):
+            continue
+        values = [int(v) for v in line.split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+        total = sum(values)
+        cores.append((total - idle, total))
+    return cores
+
+
+def cpu_per_core(start, end):
+    """Return the utilisation of each core in percent between two samples."""
+    if start is None or end is None:
+        return None
+    usage = []
+    for (busy0, total0), (busy1, total1) in zip(start, end):
+        total = total1 - total0
+        usage.append(round(100.0 * (busy1 - busy0) / total, 1) if total else 0.0)
+    return usage
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in KiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB everywhere else
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def build_grid(num_participants, width, height, framerate, num_cols, tile_size,
+               prescale=False):
+    """Build the participant grid and return (pipeline, compositor, sink)."""
+    pipeline = Gst.Pipeline.new("benchmark")
+    compositor = Gst.ElementFactory.make("compositor", "compositor")
+    sink = Gst.ElementFactory.make("fakesink", "fakesink")
+    if not compositor or not sink:
+        raise RuntimeError("'compositor' or 'fakesink' gstreamer plugin missing")
+
+    # Render as fast as possible, the sink's own counters replace any per-buffer callback
+    sink.set_property('sync', False)
+    sink.set_property('async', False)
+    pipeline.add(compositor)
+    pipeline.add(sink)
+
+    caps = Gst.Caps.from_string(
+        f'video/x-raw,width={width},height={height},framerate={framerate}/1')
+    tile_caps = Gst.Caps.from_string(
+        f'video/x-raw,width={tile_size},height={tile_size},pixel-aspect-ratio=1/1')
+
+    for participant_num in range(num_participants):
+        src = Gst.ElementFactory.make("videotestsrc", f'src+{participant_num}')
+        src.set_property('pattern', participant_num % 25)
+        capsfilter = Gst.ElementFactory.make("capsfilter", f'caps+{participant_num}')
+        capsfilter.set_property('caps', caps)
+        pipeline.add(src)
+        pipeline.add(capsfilter)
+        src.link(capsfilter)
+
+        if prescale:
+            # Same per-tile scaling stage as ParticipantBranch
+            scale = Gst.ElementFactory.make("videoscale", f'scale+{participant_num}')
+            tilecaps = Gst.ElementFactory.make("capsfilter", f'tilecaps+{participant_num}')
+            tilecaps.set_property('caps', tile_caps)
+            pipeline.add(scale)
+            pipeline.add(tilecaps)
+            capsfilter.link(scale)
+            scale.link(tilecaps)
+            capsfilter = tilecaps
+
+        row = participant_num // num_cols
+        col = participant_num % num_cols
+
+        # Same tile placement as add_video_source()
+        pad = compositor.get_request_pad(f'sink_{participant_num}')
+        pad.set_property('xpos', tile_size * col)
+        pad.set_property('ypos', tile_size * row)
+        pad.set_property('width', tile_size)
+        pad.set_property('height', tile_size)
+        capsfilter.get_static_pad("src").link(pad)
+
+    compositor.link(sink)
+    return pipeline, compositor, sink
+
+
+def rendered_frames(sink):
+    """Return the number of buffers the sink has rendered so far."""
+    stats = sink.get_property('stats')
+    ok, rendered = stats.get_uint64('rendered')
+    return rendered if ok else 0
+
+
+def run_benchmark(num_participants, width, height, framerate, num_cols, tile_size,
+                  warmup, duration, prescale=False):
+    """Run one measurement and return the result as a dict."""
+    pipeline, compositor, sink = build_grid(
+        num_participants, width, height, framerate, num_cols, tile_size, prescale)
+    loop = GLib.MainLoop()
+    result = {
+        'participants': num_participants,
+        'width': width,
+        'height': height,
+        'framerate': framerate,
+        'num_cols': num_cols,
+        'tile_size': tile_size,
+        'prescale': prescale,
+        'warmup_s': warmup,
+        'duration_s': duration,
+    }
+    window = {}
+
+    def bus_call(bus, message):
+        if message.type == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            result['error'] = f'{err}: {debug}'
+            loop.quit()
+        elif message.type == Gst.MessageType.EOS:
+            loop.quit()
+        return True
+
+    def start_window():
+        window['frames'] = rendered_frames(sink)
+        window['cpu'] = read_cpu_times()
+        window['process'] = os.times()
+        window['time'] = time.monotonic()
+        GLib.timeout_add(int(duration * 1000), end_window)
+        return GLib.SOURCE_REMOVE
+
+    def end_window():
+        elapsed = time.monotonic() - window['time']
+        frames = rendered_frames(sink) - window['frames']
+        process = os.times()
+        process_cpu = (process.user - window['process'].user) + \
+                      (process.system - window['process'].system)
+
+        result['frames'] = frames
+        result['fps'] = round(frames / elapsed, 2)
+        result['realtime_factor'] = round(frames / elapsed / framerate, 3)
+        result['process_cpu_cores'] = round(process_cpu / elapsed, 3)
+        result['cpu_per_core_percent'] = cpu_per_core(window['cpu'], read_cpu_times())
+        loop.quit()
+        return GLib.SOURCE_REMOVE
+
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+    bus.connect("message", bus_call)
+
+    pipeline.set_state(Gst.State.PLAYING)
+    GLib.timeout_add(int(warmup * 1000), start_window)
+    try:
+        loop.run()
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+        bus.remove_signal_watch()
+
+    result['peak_rss_kb'] = peak_rss_kb()
+    return result
+
+
+def parse_participants(value):
+    """Parse a participant count or a comma separated list of counts."""
+    counts = [int(v) for v in value.split(',') if v]
+    for count in counts:
+        if not 1 <= count <= MAX_PARTICIPANTS:
+            raise argparse.ArgumentTypeError(
+                f'participant count must be between 1 and {MAX_PARTICIPANTS}')
+    return counts
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--participants', type=parse_participants, default=[9],
+                        help=f'participant count (1..{MAX_PARTICIPANTS}) or a comma separated list')
+    parser.add_argument('--width', type=int, default=640, help='source width')
+    parser.add_argument('--height', type=int, default=480, help='source height')
+    parser.add_argument('--framerate', type=int, default=30, help='source framerate')
+    parser.add_argument('--num-cols', type=int, default=4, help='tiles per grid row')
+    parser.add_argument('--tile-size', type=int, default=320, help='tile width and height')
+    parser.add_argument('--prescale', action='store_true',
+                        help='scale each source to its tile size before the compositor')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds before measuring')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to measure')
+    options = parser.parse_args(args[1:])
+
+    if len(options.participants) > 1:
+        # One process per run, otherwise peak RSS leaks from one count into the next
+        results = []
+        for count in options.participants:
+            cmd = [sys.executable, os.path.abspath(__file__),
+                   '--participants', str(count),
+                   '--width', str(options.width),
+                   '--height', str(options.height),
+                   '--framerate', str(options.framerate),
+                   '--num-cols', str(options.num_cols),
+                   '--tile-size', str(options.tile_size),
+                   '--warmup', str(options.warmup),
+                   '--duration', str(options.duration)]
+            if options.prescale:
+                cmd.append('--prescale')
+            run = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+            try:
+                # A run that failed cleanly still reports its error as JSON
+                result = json.loads(run.stdout)
+            except ValueError:
+                # Crashed or printed something else, report it and go on with the sweep
+                result = {'participants': count,
+                          'error': f'run failed, output: {run.stdout.strip()[-200:]!r}'}
+            if run.returncode:
+                result['returncode'] = run.returncode
+            results.append(result)
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0
+
+    Gst.init(None)
+    result = run_benchmark(options.participants[0], options.width, options.height,
+                           options.framerate, options.num_cols, options.tile_size,
+                           options.warmup, options.duration, options.prescale)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if 'error' in result else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,150 @@
+"""
+Per-participant branch between a source and its compositor sink pad.
+
+A `ParticipantBranch` wraps the participant's source in a bin together with
+the processing that belongs to that participant only, and exposes a single
+`src` ghost pad to link to the compositor. The room adds, links and disposes
+of the bin exactly like a bare source.
+
+With `prescale=True` the branch scales frames to the size of the tile the
+participant is assigned, so the compositor receives tile-sized frames instead
+of scaling full-resolution ones itself. `set_tile_size()` updates the caps
+filter when the layout changes the tile size and the branch renegotiates on
+its next frame.
+
+With `queue` set, a bounded queue right after the source gives the participant
+its own streaming thread. The source never waits for the scaler or the
+compositor: when the queue is full it leaks frames (the oldest ones by
+default), so a slow or stalled participant only costs its own tile.
+`queue_stats()` reports the fill level and how often the queue overran.
+
+With `parkable=True` a valve right after the source lets the room park the
+participant when it is off the visible page: its frames are dropped before
+any queueing, scaling or blending, and `set_parked(False)` lets them through
+again without relinking anything.
+
+With `ratelimit=True` a videorate element caps the participant's framerate.
+`set_max_framerate()` changes the cap at runtime, e.g. 5-15 fps for small or
+inactive tiles and uncapped for the active speaker; frames above the cap are
+dropped before they are queued or scaled.
+
+With `tappable=True` a tee right after the source lets frame taps (tap.py)
+see the participant's frames at source resolution, whether it is visible or
+parked. The tee passes the frames on to the rest of the branch unchanged.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# videorate max-rate meaning "no cap"
+UNLIMITED_FPS = 2147483647
+
+# Queue properties used for `queue=True`, a dict passed as `queue` overrides them
+DEFAULT_QUEUE = {
+    'max-size-buffers': 3,
+    'max-size-bytes': 0,
+    'max-size-time': 0,
+    'leaky': 'downstream',
+}
+
+
+class ParticipantBranch:
+    """The elements between a participant's source and its compositor pad."""
+
+    def __init__(self, participant_id, src, tile_size=None, prescale=True, queue=None,
+                 parkable=False, ratelimit=False, tappable=False):
+        self.src = src
+        self.bin = Gst.Bin.new(f'branch+{participant_id}')
+        self.tile_size = None
+        self.queue = None
+        self.overruns = 0
+        self.parked = False
+        self.max_framerate = None
+        self._capsfilter = None
+        self._valve = None
+        self._videorate = None
+        self.tee = None
+
+        elements = [src]
+        if tappable:
+            self.tee = Gst.ElementFactory.make('tee', f'tee+{participant_id}')
+            # Taps come and go, the tee never waits for them
+            self.tee.set_property('allow-not-linked', True)
+            elements.append(self.tee)
+        if parkable:
+            self._valve = Gst.ElementFactory.make('valve', f'valve+{participant_id}')
+            elements.append(self._valve)
+        if ratelimit:
+            self._videorate = Gst.ElementFactory.make('videorate', f'rate+{participant_id}')
+            # Only drop frames to honour the cap, never duplicate them
+            self._videorate.set_property('drop-only', True)
+            elements.append(self._videorate)
+        if queue:
+            self.queue = Gst.ElementFactory.make('queue', f'queue+{participant_id}')
+            properties = dict(DEFAULT_QUEUE)
+            if isinstance(queue, dict):
+                properties.update(queue)
+            for name, value in properties.items():
+                # Parses enum nicks such as leaky=downstream like gst-launch does
+                Gst.util_set_object_arg(self.queue, name, str(value))
+            # Emitted only when the queue is full, not per buffer
+            self.queue.connect('overrun', self._overrun_cb)
+            elements.append(self.queue)
+
+        if prescale:
+            scale = Gst.ElementFactory.make('videoscale', f'scale+{participant_id}')
+            self._capsfilter = Gst.ElementFactory.make('capsfilter', f'tilecaps+{participant_id}')
+            elements += [scale, self._capsfilter]
+        if elements[-1] is self.tee:
+            # The tee only has request src pads, the ghost pad needs a static one
+            elements.append(Gst.ElementFactory.make('identity', f'out+{participant_id}'))
+
+        for element in elements:
+            self.bin.add(element)
+        for upstream, downstream in zip(elements, elements[1:]):
+            upstream.link(downstream)
+        self.bin.add_pad(Gst.GhostPad.new('src', elements[-1].get_static_pad('src')))
+
+        if tile_size is not None:
+            self.set_tile_size(*tile_size)
+
+    def set_tile_size(self, width, height):
+        """Scale to a new tile size, does nothing without prescaling or if unchanged."""
+        if self._capsfilter is None or self.tile_size == (width, height):
+            return
+        self.tile_size = (width, height)
+        # Square pixels, so videoscale really resizes instead of adjusting the aspect ratio
+        caps = Gst.Caps.from_string(
+            f'video/x-raw,width={width},height={height},pixel-aspect-ratio=1/1')
+        self._capsfilter.set_property('caps', caps)
+
+    def set_parked(self, parked):
+        """Drop (or stop dropping) the participant's frames, return True if that changed."""
+        if self._valve is None or self.parked == parked:
+            return False
+        self.parked = parked
+        self._valve.set_property('drop', parked)
+        return True
+
+    def set_max_framerate(self, fps):
+        """Cap the framerate, None removes the cap, return True if that changed."""
+        if self._videorate is None or self.max_framerate == fps:
+            return False
+        self.max_framerate = fps
+        self._videorate.set_property('max-rate', fps if fps is not None else UNLIMITED_FPS)
+        return True
+
+    def queue_stats(self):
+        """Return the queue fill level and overrun count, or None without a queue."""
+        if self.queue is None:
+            return None
+        return {
+            'level_buffers': self.queue.get_property('current-level-buffers'),
+            'level_time_ms': round(self.queue.get_property('current-level-time') / Gst.MSECOND, 1),
+            'max_buffers': self.queue.get_property('max-size-buffers'),
+            'overruns': self.overruns,
+        }
+
+    def _overrun_cb(self, queue):
+        self.overruns += 1
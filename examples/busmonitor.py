@@ -0,0 +1,216 @@
+"""
+Filtered bus handling with per-element statistics.
+
+Connecting to the bus "message" signal wakes Python for every message: QoS,
+state changes, latency, element messages and so on, although most handlers
+only care about EOS and errors. `BusMonitor` connects to the detailed
+"message::<type>" signals of the message types it tracks instead, so the
+other messages are dispatched in C and never reach Python.
+
+The tracked messages are only aggregated per element when they arrive, and
+reported at a fixed rate:
+
+- QoS: processed and dropped buffers and the last jitter
+- state changes: the current state of the pipeline and of its direct children
+  (branch bins, mixers, sinks), the elements inside them change state with
+  their bin
+- latency: a latency message only schedules one pipeline latency
+  recalculation, however many arrive before it runs
+- warnings and errors: counters
+- buffering (not tracked by default): the percentage, passed on to `on_buffering`
+
+With a `room`, an error raised inside a participant's branch only evicts that
+participant (`on_participant_error` is told about it) and the room keeps
+running. Further errors of an evicted participant are only counted. Other
+errors go to `on_error`, EOS to `on_eos`. Elements that left the pipeline are
+dropped from the statistics when a snapshot is taken.
+"""
+
+import json
+import logging
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+log = logging.getLogger("bus")
+
+# Message types handled by default, the others never reach Python
+DEFAULT_TYPES = ('eos', 'error', 'warning', 'qos', 'latency', 'state-changed')
+
+
+class ElementStats:
+    """Bus statistics of one element."""
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0
+        self.jitter_ms = None
+        self.state = None
+        self.warnings = 0
+        self.errors = 0
+
+    def as_dict(self):
+        stats = {}
+        if self.processed or self.dropped:
+            stats['qos'] = {'processed': self.processed, 'dropped': self.dropped,
+                            'jitter_ms': self.jitter_ms}
+        if self.state is not None:
+            stats['state'] = self.state
+        if self.warnings:
+            stats['warnings'] = self.warnings
+        if self.errors:
+            stats['errors'] = self.errors
+        return stats
+
+
+class BusMonitor:
+    """Handle a few message types of a pipeline bus and aggregate them per element."""
+
+    def __init__(self, pipeline, room=None, on_eos=None, on_error=None,
+                 on_participant_error=None, on_buffering=None, types=DEFAULT_TYPES):
+        self.pipeline = pipeline
+        self.room = room
+        self.on_eos = on_eos
+        self.on_error = on_error
+        self.on_participant_error = on_participant_error
+        self.on_buffering = on_buffering
+        self.types = types
+        self.counts = dict.fromkeys(types, 0)
+        self.elements = {}   # element name -> ElementStats
+        self.evicted = []
+        self._evicted_bins = set()  # names of the bins of evicted participants
+        self.latency_recalculations = 0
+        self._bus = None
+        self._handlers = []
+        self._latency_pending = False
+        self._timeout_id = None
+
+    def start(self, interval=None, callback=None):
+        """Start handling messages, and report a snapshot every `interval` seconds if set."""
+        self._bus = self.pipeline.get_bus()
+        self._bus.add_signal_watch()
+        for message_type in self.types:
+            handler = getattr(self, '_' + message_type.replace('-', '_') + '_cb')
+            self._handlers.append(self._bus.connect('message::' + message_type, handler))
+        if interval:
+            callback = callback or (lambda snapshot: log.info(json.dumps(snapshot)))
+            self._timeout_id = GLib.timeout_add_seconds(interval, self._report_cb, callback)
+
+    def stop(self):
+        for handler in self._handlers:
+            self._bus.disconnect(handler)
+        self._handlers = []
+        self._bus.remove_signal_watch()
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+
+    def snapshot(self):
+        """Return the message counts and the statistics of every element."""
+        def gone(name):
+            return name != self.pipeline.get_name() and self.pipeline.get_by_name(name) is None
+
+        for name in [name for name in self.elements if gone(name)]:
+            del self.elements[name]
+        self._evicted_bins = {name for name in self._evicted_bins if not gone(name)}
+        elements = {name: stats.as_dict() for name, stats in self.elements.items()}
+        return {
+            'messages': dict(self.counts),
+            'elements': {name: stats for name, stats in elements.items() if stats},
+            'latency_recalculations': self.latency_recalculations,
+            'evicted': [str(participant_id) for participant_id in self.evicted],
+        }
+
+    def _stats(self, message):
+        self.counts[Gst.MessageType.get_name(message.type)] += 1
+        name = message.src.get_name() if message.src is not None else None
+        stats = self.elements.get(name)
+        if stats is None:
+            stats = self.elements[name] = ElementStats()
+        return stats
+
+    def _eos_cb(self, bus, message):
+        self._stats(message)
+        if self.on_eos is not None:
+            self.on_eos()
+
+    def _error_cb(self, bus, message):
+        self._stats(message).errors += 1
+        err, debug = message.parse_error()
+        ancestors = self._ancestors(message.src)
+        if ancestors & self._evicted_bins:
+            # The participant is already on its way out
+            return
+        participant_id, bins = self._participant(ancestors)
+        if participant_id is None:
+            log.error(f"{message.src.get_name()}: {err.message}")
+            if self.on_error is not None:
+                self.on_error(err, debug)
+            return
+
+        log.warning(f"Evicting participant {participant_id} after an error: {err.message}")
+        self.evicted.append(participant_id)
+        self._evicted_bins.update(bins)
+        self.room.remove_participant(participant_id)
+        if self.on_participant_error is not None:
+            self.on_participant_error(participant_id, err, debug)
+
+    def _warning_cb(self, bus, message):
+        self._stats(message).warnings += 1
+
+    def _buffering_cb(self, bus, message):
+        self._stats(message)
+        if self.on_buffering is not None:
+            self.on_buffering(message.parse_buffering())
+
+    def _qos_cb(self, bus, message):
+        stats = self._stats(message)
+        _, stats.processed, stats.dropped = message.parse_qos_stats()
+        jitter, _, _ = message.parse_qos_values()
+        stats.jitter_ms = round(jitter / Gst.MSECOND, 1)
+
+    def _state_changed_cb(self, bus, message):
+        if message.src is not self.pipeline and message.src.get_parent() is not self.pipeline:
+            self.counts['state-changed'] += 1
+            return
+        _, new, _ = message.parse_state_changed()
+        self._stats(message).state = new.value_nick
+
+    def _latency_cb(self, bus, message):
+        self._stats(message)
+        if not self._latency_pending:
+            # Joins make several elements post latency at once, recalculate once for all
+            self._latency_pending = True
+            GLib.idle_add(self._recalculate_latency_cb)
+
+    def _recalculate_latency_cb(self):
+        self._latency_pending = False
+        self.latency_recalculations += 1
+        self.pipeline.recalculate_latency()
+        return GLib.SOURCE_REMOVE
+
+    def _report_cb(self, callback):
+        callback(self.snapshot())
+        return GLib.SOURCE_CONTINUE
+
+    def _ancestors(self, element):
+        # Names of the element and the bins it is in, a participant's branch bin among them
+        ancestors = set()
+        while element is not None:
+            ancestors.add(element.get_name())
+            element = element.get_parent()
+        return ancestors
+
+    def _participant(self, ancestors):
+        if self.room is None:
+            return None, ()
+        for participant in self.room.participants:
+            bins = [participant.branch.bin] if participant.branch is not None else []
+            if participant.audio is not None:
+                bins.append(participant.audio.bin)
+            names = {b.get_name() for b in bins}
+            if names & ancestors:
+                return participant.id, names
+        return None, ()
@@ -0,0 +1,74 @@
+"""
+Compositor groups, used by the room to composite large rooms in stages.
+
+A `CompositorGroup` is one compositor together with its layout engine, its
+deadline monitor and the participants it mixes. A normal room has a single
+group around its compositor.
+
+`make_cascade()` builds the hierarchical variant: the canvas is split into
+grid regions and every region gets its own sub-compositor, whose output is
+capped to the region size and fed through a small queue into the top-level
+compositor. Each aggregator runs its own streaming thread, so 36-64 tiles are
+blended by several threads in parallel and the top-level compositor only
+copies a handful of pre-composited regions. Use it with live sources, so an
+empty group never holds up the top-level compositor.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from layout import GRID, LayoutEngine, layout_tiles
+from live import DeadlineMonitor, configure_live
+
+
+class CompositorGroup:
+    """A compositor, its layout engine and the participants it mixes."""
+
+    def __init__(self, compositor, size=None, live_latency_ms=None):
+        self.compositor = compositor
+        # (width, height) the group lays its participants out in, None for a free-size grid
+        self.size = size
+        self.layout = LayoutEngine(compositor)
+        self.members = {}  # participant id -> participant, in join order
+        self.deadlines = None
+        if live_latency_ms is not None:
+            configure_live(compositor, live_latency_ms)
+            self.deadlines = DeadlineMonitor(compositor)
+        if size is not None:
+            # Whatever the tiles don't cover stays black instead of the checker pattern
+            Gst.util_set_object_arg(compositor, 'background', 'black')
+
+    def __len__(self):
+        return len(self.members)
+
+
+def make_cascade(pipeline, top, groups, canvas, live_latency_ms=None):
+    """Create `groups` sub-compositors that feed `top`, one per region of the canvas."""
+    top_layout = LayoutEngine(top)
+    result = []
+    for index, region in enumerate(layout_tiles(GRID, groups, *canvas)):
+        width, height = region[2:4]
+        compositor = Gst.ElementFactory.make('compositor', f'group+{index}')
+        capsfilter = Gst.ElementFactory.make('capsfilter', f'groupcaps+{index}')
+        capsfilter.set_property(
+            'caps', Gst.Caps.from_string(f'video/x-raw,width={width},height={height}'))
+        # Decouples the group's streaming thread from the top-level compositor
+        queue = Gst.ElementFactory.make('queue', f'groupqueue+{index}')
+        queue.set_property('max-size-buffers', 2)
+        queue.set_property('max-size-bytes', 0)
+        queue.set_property('max-size-time', 0)
+
+        for element in (compositor, capsfilter, queue):
+            pipeline.add(element)
+        compositor.link(capsfilter)
+        capsfilter.link(queue)
+
+        pad = top.get_request_pad(f'sink_{index}')
+        top_layout.apply([(pad, region)])
+        queue.get_static_pad('src').link(pad)
+
+        for element in (queue, capsfilter, compositor):
+            element.sync_state_with_parent()
+        result.append(CompositorGroup(compositor, (width, height), live_latency_ms))
+    return result
@@ -0,0 +1,32 @@
+"""
+Helpers shared by the room, its output stage and its taps.
+
+`disposer` is the one executor that tears down elements removed from a playing
+pipeline. Setting an element to NULL can't happen on its own streaming thread,
+nor should it stall the GLib main loop, so pad probe callbacks submit the
+teardown to it instead.
+
+`to_running_time()` converts a timestamp seen on a pad to running time, using
+the pad's current segment and offset.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# A few threads, so an output branch waiting for its EOS doesn't hold up the
+# teardown of participants
+disposer = ThreadPoolExecutor(max_workers=4, thread_name_prefix='dispose')
+
+
+def to_running_time(pad, timestamp):
+    """Return `timestamp` on `pad` as running time, or None if it has none yet."""
+    event = pad.get_sticky_event(Gst.EventType.SEGMENT, 0)
+    if event is None or timestamp < 0 or timestamp == Gst.CLOCK_TIME_NONE:
+        return None
+    running_time = event.parse_segment().to_running_time(Gst.Format.TIME, timestamp)
+    if running_time == Gst.CLOCK_TIME_NONE:
+        return None
+    return running_time + pad.get_offset()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+Run the compositor as a service: rooms are created and driven over HTTP.
+
+This script starts the control server of server.py on localhost. Rooms render
+headless into a fakesink by default, pass --sink autovideosink to watch them.
+
+Usage:
+    python3 control-server.py --port 8080
+
+    curl -X POST localhost:8080/rooms -d '{"room": "demo"}'
+    curl -X POST localhost:8080/rooms/demo/participants -d '{"participant": "alice"}'
+    curl -X PUT localhost:8080/rooms/demo/layout -d '{"layout": "speaker", "speaker": "alice"}'
+    curl localhost:8080/rooms/demo/stats
+    curl -X DELETE localhost:8080/rooms/demo/participants/alice
+
+Requirements:
+- GStreamer and the necessary Python bindings (gi.repository) must be installed.
+
+"""
+
+import argparse
+import logging
+import sys
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from control import run
+from server import REQUEST_TIMEOUT_MS, ControlServer, RoomManager
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("main")
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--sink', default='fakesink', help='sink element of new rooms')
+    parser.add_argument('--timeout-ms', type=int, default=REQUEST_TIMEOUT_MS,
+                        help='time budget of a request')
+    options = parser.parse_args(args[1:])
+
+    Gst.init(None)
+    server = ControlServer(RoomManager(sink=options.sink), options.host, options.port,
+                           options.timeout_ms)
+    try:
+        run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
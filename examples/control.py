@@ -0,0 +1,167 @@
+"""
+asyncio control plane for a room.
+
+The examples drive participants from chained GLib timeouts. `AsyncRoom` puts
+an asyncio API in front of a `Room` instead:
+
+    await room.add(participant_id)
+    await room.remove(participant_id)
+    await room.set_layout(SPEAKER)
+
+The GStreamer side stays on the GLib main loop, the asyncio loop runs next to
+it in another thread (see `run()`). Commands are not applied one by one, they
+are debounced: every command restarts a short quiet window (`window_ms`), and
+once no command arrived for that long, or `max_wait_ms` after the first one at
+the latest, everything collected is handed to the GLib loop as one batch and
+applied inside `Room.batch()`. A join storm of 20 participants in 100 ms
+therefore costs a single relayout, while a steady stream of commands still
+gets applied every `max_wait_ms`. Each awaiting caller gets the result of its
+own command, or its exception, once the batch was applied.
+`call_on_main_loop()` runs any other function on the GLib loop and awaits its
+result the same way.
+"""
+
+import asyncio
+import logging
+import threading
+
+import gi
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib
+
+log = logging.getLogger("control")
+
+# Default quiet time after the last command before the collected ones are applied
+COALESCE_WINDOW_MS = 20
+# Default longest time the first command of a batch waits, however many follow it
+COALESCE_MAX_WAIT_MS = 150
+
+
+class AsyncRoom:
+    """Awaitable room commands, coalesced into batches on the GLib main loop."""
+
+    def __init__(self, room, window_ms=COALESCE_WINDOW_MS, max_wait_ms=COALESCE_MAX_WAIT_MS,
+                 loop=None):
+        self.room = room
+        self.window = window_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.commands = 0
+        self._loop = loop
+        self._pending = []  # (future, method, args) waiting for the window to close
+        self._handle = None
+        self._deadline = None  # loop time the current batch is applied at the latest
+
+    async def add(self, participant_id, src=None):
+        """Add a participant, return its id once it is linked and laid out."""
+        participant = await self._submit(self.room.add_participant, participant_id, src)
+        return participant.id
+
+    async def remove(self, participant_id):
+        """Remove a participant, returns once its removal has started."""
+        await self._submit(self.room.remove_participant, participant_id)
+
+    async def set_layout(self, layout_kind):
+        """Switch the room to another layout type."""
+        await self._submit(self.room.set_layout, layout_kind)
+
+    async def set_speaker(self, participant_id):
+        """Give a participant the main tile."""
+        await self._submit(self.room.set_speaker, participant_id)
+
+    async def set_page(self, page):
+        """Show another page of a paginated room."""
+        await self._submit(self.room.set_page, page)
+
+    async def stats(self):
+        """Return the room statistics, read on the GLib main loop."""
+        stats = await self._submit(self.room.stats)
+        stats['control'] = {'batches': self.batches, 'commands': self.commands}
+        return stats
+
+    def _submit(self, method, *args):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        self._pending.append((future, method, args))
+        now = self._loop.time()
+        if self._handle is None:
+            self._deadline = now + self.max_wait
+        else:
+            self._handle.cancel()
+        # Restart the quiet window, without going past the deadline of the batch
+        self._handle = self._loop.call_at(min(now + self.window, self._deadline), self._flush)
+        return future
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        self._handle = None
+        GLib.idle_add(self._apply, batch)
+
+    def _apply(self, batch):
+        # Runs on the GLib main loop, like every other change to the pipeline
+        results = []
+        try:
+            with self.room.batch():
+                for future, method, args in batch:
+                    try:
+                        results.append((future, method(*args), None))
+                    except Exception as error:
+                        results.append((future, None, error))
+        except Exception as error:
+            # Applying the batch failed as a whole, e.g. its relayout, fail every command
+            log.error(f"Batch of {len(batch)} commands failed: {error}")
+            results = [(future, None, error) for future, _, _ in batch]
+        finally:
+            # Settle every future whatever happened, nobody waits forever
+            settled = {future for future, _, _ in results}
+            results += [(future, None, RuntimeError('batch was not applied'))
+                        for future, _, _ in batch if future not in settled]
+            self.batches += 1
+            self.commands += len(batch)
+            self._loop.call_soon_threadsafe(self._resolve, results)
+        log.debug(f"Applied {len(batch)} commands in one batch")
+        return GLib.SOURCE_REMOVE
+
+    def _resolve(self, results):
+        for future, result, error in results:
+            _settle(future, result, error)
+
+
+def call_on_main_loop(func, *args):
+    """Run `func` on the GLib main loop, return an asyncio future of its result."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def idle_cb():
+        try:
+            result, error = func(*args), None
+        except Exception as exc:
+            result, error = None, exc
+        loop.call_soon_threadsafe(_settle, future, result, error)
+        return GLib.SOURCE_REMOVE
+
+    GLib.idle_add(idle_cb)
+    return future
+
+
+def _settle(future, result, error):
+    # The caller may have stopped waiting, e.g. on a timeout
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def run(coro):
+    """Run the GLib main loop in a background thread and `coro` on asyncio until it returns."""
+    loop = GLib.MainLoop()
+    thread = threading.Thread(target=loop.run, name='glib', daemon=True)
+    thread.start()
+    try:
+        return asyncio.run(coro)
+    finally:
+        loop.quit()
+        thread.join()
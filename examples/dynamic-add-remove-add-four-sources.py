@@ -3,75 +3,46 @@
 import sys
 import gi
 import logging
-from threading import Thread, Event
 gi.require_version('Gst', '1.0')
 gi.require_version('GLib', '2.0')
 gi.require_version('GObject', '2.0')
 from gi.repository import GLib, GObject, Gst
 
+from room import Room
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("main")
 
 def add_video_sources(pipe, loop):
-    log.info("Adding videotestsrcs")
-    # Create Sources
-    srcs = [Gst.ElementFactory.make("videotestsrc") for _ in range(4)]
-
     sink = Gst.ElementFactory.make("autovideosink", "autovideosink")
-
     pipe.add(sink)
+
     log.info("Adding compositor")
     compositor = Gst.ElementFactory.make("compositor", "compositor")
-    # Add elements to the pipeline
-    [pipe.add(src) for src in srcs]  
     pipe.add(compositor)
 
-    # Request pads from the compositor
-    pads = [compositor.get_request_pad(f'sink_{i}') for i in range(4)]
-    # Set properties for the pads to control the layout
-    pad_properties = [(0, 0), (320, 0), (0, 320), (320, 320)]
-    [pads[i].set_property('xpos', x) for i, (x, _) in enumerate(pad_properties)]
-    [pads[i].set_property('ypos', y) for i, (_, y) in enumerate(pad_properties)]
-    [pad.set_property('width', 320) for pad in pads]
-    [pad.set_property('height', 320) for pad in pads]
-
-   # Get the source pads
-    for i, src in enumerate(srcs):
-        srcpad = src.get_static_pad("src")
-        srcpad.link(pads[i])
-
-    # Link the sources to the compositor
-    [src.link(compositor) for src in srcs]
-
     # Link the compositor to the sink
     compositor.link(sink)
 
     pipe.set_state(Gst.State.PLAYING)
 
+    # Participants join and leave the playing pipeline, nothing else changes state
+    log.info("Adding videotestsrcs")
+    room = Room(pipe, compositor, num_cols=2)
+    [room.add_participant(i) for i in range(4)]
+
     log.info("Waiting for a while before removing one source")
-    GLib.timeout_add_seconds(5, remove_video_source, pipe, srcs[3], pads[3], compositor)
-    GLib.timeout_add_seconds(10, remove_video_source, pipe, srcs[2], pads[2], compositor)
-    GLib.timeout_add_seconds(15, add_new_video_source, pipe, compositor)
-
-def remove_video_source(pipe, src, pad2, compositor):   
-    log.debug(src.set_state(Gst.State.NULL))  # (5)
-    log.debug(pipe.remove(src))
-    log.debug(compositor.release_request_pad(pad2))  # (6)
-
-def add_new_video_source(pipe, compositor):
-    pipe.set_state(Gst.State.PAUSED)
-    src = Gst.ElementFactory.make("videotestsrc")
-    pipe.add(src)
-    srcpad = src.get_static_pad("src")
-    sink_pad = compositor.get_request_pad(f'sink_2')
-    sink_pad.set_property('xpos', 0)
-    sink_pad.set_property('ypos', 320)
-    sink_pad.set_property('width', 320)
-    sink_pad.set_property('height', 320)
-    srcpad.link(sink_pad)
-    src.link(compositor)
-    pipe.set_state(Gst.State.PLAYING)
-    print("Nothing")
+    GLib.timeout_add_seconds(5, remove_video_source, room, 3)
+    GLib.timeout_add_seconds(10, remove_video_source, room, 2)
+    GLib.timeout_add_seconds(15, add_new_video_source, room, 4)
+
+def remove_video_source(room, participant_id):
+    room.remove_participant(participant_id)
+    return GLib.SOURCE_REMOVE
+
+def add_new_video_source(room, participant_id):
+    room.add_participant(participant_id)
+    return GLib.SOURCE_REMOVE
 
 
 def main(args):
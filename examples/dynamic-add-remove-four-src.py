@@ -9,6 +9,8 @@ gi.require_version('GLib', '2.0')
 gi.require_version('GObject', '2.0')
 from gi.repository import GLib, GObject, Gst
 
+from layout import GRID, LayoutEngine, layout_tiles
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("main")
 
@@ -28,11 +30,8 @@ def add_video_sources(pipe, loop):
     # Request pads from the compositor
     pads = [compositor.get_request_pad(f'sink_{i}') for i in range(4)]
     # Set properties for the pads to control the layout
-    pad_properties = [(0, 0), (320, 0), (0, 320), (320, 320)]
-    [pads[i].set_property('xpos', x) for i, (x, _) in enumerate(pad_properties)]
-    [pads[i].set_property('ypos', y) for i, (_, y) in enumerate(pad_properties)]
-    [pad.set_property('width', 320) for pad in pads]
-    [pad.set_property('height', 320) for pad in pads]
+    layout = LayoutEngine(compositor)
+    layout.apply(zip(pads, layout_tiles(GRID, 4, 640, 640)))
 
 
    # Get the source pads
@@ -49,12 +48,13 @@ def add_video_sources(pipe, loop):
     pipe.set_state(Gst.State.PLAYING)
 
     log.info("Waiting for a while before removing one source")
-    GLib.timeout_add_seconds(5, remove_video_source, pipe, srcs[3], pads[3], compositor)
-    GLib.timeout_add_seconds(10, remove_video_source, pipe, srcs[2], pads[2], compositor)
+    GLib.timeout_add_seconds(5, remove_video_source, pipe, srcs[3], pads[3], compositor, layout)
+    GLib.timeout_add_seconds(10, remove_video_source, pipe, srcs[2], pads[2], compositor, layout)
 
-def remove_video_source(pipe, src, pad2, compositor):   
+def remove_video_source(pipe, src, pad2, compositor, layout):   
     log.debug(src.set_state(Gst.State.NULL))  # (5)
     log.debug(pipe.remove(src))
+    layout.forget(pad2)
     log.debug(compositor.release_request_pad(pad2))  # (6)
 
 def main(args):
@@ -9,6 +9,8 @@ gi.require_version('GLib', '2.0')
 gi.require_version('GObject', '2.0')
 from gi.repository import GLib, GObject, Gst
 
+from layout import GRID, LayoutEngine, layout_tiles
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("main")
 
@@ -29,11 +31,8 @@ def add_video_sources(pipe, loop):
     # Request pads from the compositor
     pads = [compositor.get_request_pad(f'sink_{i}') for i in range(4)]
     # Set properties for the pads to control the layout
-    pad_properties = [(0, 0), (320, 0), (0, 320), (320, 320)]
-    [pads[i].set_property('xpos', x) for i, (x, _) in enumerate(pad_properties)]
-    [pads[i].set_property('ypos', y) for i, (_, y) in enumerate(pad_properties)]
-    [pad.set_property('width', 320) for pad in pads]
-    [pad.set_property('height', 320) for pad in pads]
+    layout = LayoutEngine(compositor)
+    layout.apply(zip(pads, layout_tiles(GRID, 4, 640, 640)))
 
    # Get the source pads
     for i, src in enumerate(srcs):
@@ -49,28 +48,26 @@ def add_video_sources(pipe, loop):
     pipe.set_state(Gst.State.PLAYING)
 
     log.info("Waiting for a while before removing one source")
-    GLib.timeout_add_seconds(5, remove_video_source, pipe, srcs[3], pads[3], compositor)
+    GLib.timeout_add_seconds(5, remove_video_source, pipe, srcs[3], pads[3], compositor, layout)
 
-def remove_video_source(pipe, src, pad2, compositor):   
+def remove_video_source(pipe, src, pad2, compositor, layout):   
     log.debug(src.set_state(Gst.State.NULL))  # (5)
     log.debug(pipe.remove(src))
+    layout.forget(pad2)
     log.debug(compositor.release_request_pad(pad2))  # (6)
+    # Center the remaining bottom tile, only xpos actually changes
     sink_pad = compositor.get_static_pad("sink_2")
-    sink_pad.set_property('xpos', 160)
-    sink_pad.set_property('ypos', 320)
+    layout.apply([(sink_pad, (160, 320, 320, 320))])
 
     
 
-def add_new_video_source(pipe, compositor):
+def add_new_video_source(pipe, compositor, layout):
     pipe.set_state(Gst.State.PAUSED)
     src = Gst.ElementFactory.make("videotestsrc")
     pipe.add(src)
     srcpad = src.get_static_pad("src")
     sink_pad = compositor.get_request_pad(f'sink_2')
-    sink_pad.set_property('xpos', 0)
-    sink_pad.set_property('ypos', 320)
-    sink_pad.set_property('width', 320)
-    sink_pad.set_property('height', 320)
+    layout.apply([(sink_pad, (0, 320, 320, 320))])
     srcpad.link(sink_pad)
     src.link(compositor)
     pipe.set_state(Gst.State.PLAYING)
@@ -1,26 +1,56 @@
 #!/usr/bin/env python
 
+import argparse
 import sys
 
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import GObject, Gst
 
-def bus_call(bus, message, loop):
-    t = message.type
-    if t == Gst.MessageType.EOS:
-        sys.stdout.write("End-of-stream\n")
-        loop.quit()
-    elif t == Gst.MessageType.ERROR:
-        err, debug = message.parse_error()
-        sys.stderr.write("Error: %s: %s\n" % (err, debug))
-        loop.quit()
-    return True
+from busmonitor import DEFAULT_TYPES, BusMonitor
+from playback import PlaybackStats, configure_playbin
+from playlist import GaplessPlaylist
+
+def eos_cb(loop):
+    sys.stdout.write("End-of-stream\n")
+    loop.quit()
+
+def error_cb(err, debug, loop):
+    sys.stderr.write("Error: %s: %s\n" % (err, debug))
+    loop.quit()
+
+def buffering_cb(percent, playbin, stats, download):
+    # pause while the buffer fills up, so playback doesn't stutter on a slow source. in
+    # download mode the percentage is how much of the file is on disk, playback goes on
+    if not download:
+        if percent < 100 and stats.buffering in (None, 100):
+            playbin.set_state(Gst.State.PAUSED)
+        elif percent == 100 and stats.buffering not in (None, 100):
+            playbin.set_state(Gst.State.PLAYING)
+    stats.set_buffering(percent)
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Play media files or URIs with playbin.")
+    parser.add_argument('locations', nargs='+', metavar='media file or uri',
+                        help='several locations are played as a gapless playlist')
+    parser.add_argument('--buffer-size', type=int, help='network buffering size in bytes')
+    parser.add_argument('--buffer-duration-ms', type=int, help='network buffering duration')
+    parser.add_argument('--download', action='store_true',
+                        help='progressive download buffering, for slow HTTP servers')
+    parser.add_argument('--ring-buffer-size', type=int,
+                        help='in-memory ring buffer size in bytes, used with --download')
+    parser.add_argument('--decoder-threads', type=int,
+                        help='decoding threads per decoder, 0 lets the decoder pick')
+    parser.add_argument('--no-sync', dest='sync', action='store_false',
+                        help='render as fast as frames are decoded, to measure decoding speed')
+    parser.add_argument('--no-qos', dest='qos', action='store_false',
+                        help="don't let the video sink make decoders skip late frames")
+    parser.add_argument('--stats-interval', type=int, default=1,
+                        help='seconds between two statistics lines, 0 disables them')
+    return parser.parse_args(args[1:])
 
 def main(args):
-    if len(args) != 2:
-        sys.stderr.write("usage: %s <media file or uri>\n" % args[0])
-        sys.exit(1)
+    options = parse_args(args)
 
     GObject.threads_init()
     Gst.init(None)
@@ -30,22 +60,33 @@ def main(args):
         sys.stderr.write("'playbin' gstreamer plugin missing\n")
         sys.exit(1)
 
-    # take the commandline argument and ensure that it is a uri
-    if Gst.uri_is_valid(args[1]):
-      uri = args[1]
-    else:
-      uri = Gst.filename_to_uri(args[1])
-    playbin.set_property('uri', uri)
+    # buffering, decoder threads and video sink behaviour
+    configure_playbin(playbin, options.buffer_size, options.buffer_duration_ms,
+                      options.download, options.ring_buffer_size, options.decoder_threads,
+                      options.sync, options.qos)
+
+    # play the commandline arguments as a gapless playlist, the next item is
+    # queued while the current one plays out and reported on its first frame
+    playlist = GaplessPlaylist(playbin, options.locations)
 
     # create and event loop and feed gstreamer bus mesages to it
     loop = GObject.MainLoop()
 
-    bus = playbin.get_bus()
-    bus.add_signal_watch()
-    bus.connect ("message", bus_call, loop)
+    # only the message types the monitor tracks reach python, not every bus message
+    monitor = BusMonitor(playbin, on_eos=lambda: eos_cb(loop),
+                         on_error=lambda err, debug: error_cb(err, debug, loop),
+                         on_buffering=lambda percent: buffering_cb(percent, playbin, stats,
+                                                                   options.download),
+                         types=DEFAULT_TYPES + ('buffering',))
+    monitor.start()
+
+    # print buffering, sink input and render fps and dropped frames as json lines
+    stats = PlaybackStats(playbin, monitor)
+    if options.stats_interval:
+        stats.start(options.stats_interval)
     
     # start play back and listed to events
-    playbin.set_state(Gst.State.PLAYING)
+    playlist.start()
     try:
       loop.run()
     except:
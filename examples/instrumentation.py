@@ -0,0 +1,201 @@
+"""
+Opt-in per-participant latency and frame-drop instrumentation.
+
+`Instrumentation` samples the compositor on a timer instead of running Python
+for every buffer. Every `sample_interval_ms`, on the GLib main loop, it reads
+the frame each participant's compositor sink pad currently holds
+(`get_current_buffer()`) and compares it with the running time of the
+pipeline clock:
+
+- latency: age of the frame the compositor composites for a participant, from
+  its timestamp to now, collected in a histogram per participant
+- late: samples in which that frame was older than `late_ms`
+- dropped: frames a participant delivered beyond the output framerate, which
+  the compositor never used
+- repeated: output frames for which a participant delivered nothing new, so the
+  compositor reused its previous frame
+
+Frame counts follow from how far a participant's frames advanced between
+samples, at the frame duration of its buffers or caps. The cost is a few pad
+reads per participant and sample, whatever the framerate, and nothing is
+logged per buffer. Counters and histograms cover the window since the previous
+`snapshot()`, which returns them as a dict. `start()` takes a snapshot every
+interval and hands it to a callback, by default it is logged as JSON.
+"""
+
+import json
+import logging
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+gi.require_version('GstVideo', '1.0')
+# GstVideo provides get_current_buffer() on the compositor sink pads
+from gi.repository import GLib, Gst, GstVideo
+
+from common import to_running_time
+
+log = logging.getLogger("instrumentation")
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+# Default time between two samples of the compositor pads
+SAMPLE_INTERVAL_MS = 100
+# Default age above which a participant's composited frame counts as late
+LATE_MS = 100
+
+
+class ParticipantStats:
+    """Counters of one participant for the current snapshot window."""
+
+    def __init__(self):
+        self.last_running_time = None
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.frames = 0.0
+        self.output_frames = 0.0
+        self.late = 0
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add_latency(self, latency_ms):
+        self.samples += 1
+        self.latency_sum_ms += latency_ms
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def to_dict(self):
+        buckets = {f'le_{bound}ms': count
+                   for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram)}
+        buckets['inf'] = self.histogram[-1]
+        # Compared over the whole window, so sampling jitter evens out
+        return {
+            'samples': self.samples,
+            'frames': round(self.frames),
+            'dropped': round(max(self.frames - self.output_frames, 0)),
+            'repeated': round(max(self.output_frames - self.frames, 0)),
+            'late': self.late,
+            'latency_avg_ms': round(self.latency_sum_ms / self.samples, 2)
+                              if self.samples else None,
+            'latency_max_ms': round(self.latency_max_ms, 2),
+            'latency_histogram': buckets,
+        }
+
+
+class Instrumentation:
+    """Latency and drop counters per participant, sampled from the compositor pads."""
+
+    def __init__(self, compositor, sample_interval_ms=SAMPLE_INTERVAL_MS, late_ms=LATE_MS):
+        self.compositor = compositor
+        self.sample_interval_ms = sample_interval_ms
+        self.late_ms = late_ms
+        self._stats = {}    # participant id -> ParticipantStats
+        self._pads = {}     # participant id -> compositor sink pad
+        self._last_sample = None  # running time of the previous sample
+        self._window_start = time.monotonic()
+        self._sample_id = None
+        self._timeout_id = None
+
+    def attach(self, participant_id, pad):
+        """Start sampling a participant's compositor sink pad."""
+        self._stats[participant_id] = ParticipantStats()
+        self._pads[participant_id] = pad
+        if self._sample_id is None:
+            self._sample_id = GLib.timeout_add(self.sample_interval_ms, self._sample_cb)
+
+    def detach(self, participant_id):
+        """Stop sampling a participant that left."""
+        self._stats.pop(participant_id, None)
+        self._pads.pop(participant_id, None)
+
+    def snapshot(self):
+        """Return the counters since the previous snapshot and start a new window."""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        result = {
+            'interval_s': round(elapsed, 3),
+            'participants': {str(participant_id): stats.to_dict()
+                             for participant_id, stats in self._stats.items()},
+        }
+        self._window_start = now
+        for stats in self._stats.values():
+            stats.reset()
+        return result
+
+    def start(self, interval=5, callback=None):
+        """Take a snapshot every `interval` seconds and pass it to `callback`."""
+        if callback is None:
+            callback = lambda snapshot: log.info(json.dumps(snapshot))
+
+        def timeout_cb():
+            callback(self.snapshot())
+            return GLib.SOURCE_CONTINUE
+
+        self.stop()
+        self._timeout_id = GLib.timeout_add_seconds(interval, timeout_cb)
+
+    def stop(self):
+        """Stop the periodic snapshots."""
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+
+    def _now(self):
+        # Running time of the pipeline clock, None before the compositor has one
+        clock = self.compositor.get_clock()
+        if clock is None:
+            return None
+        return clock.get_time() - self.compositor.get_base_time()
+
+    def _sample_cb(self):
+        # Runs on the GLib main loop every sample interval
+        if not self._pads:
+            # Nobody to sample, attach() starts again
+            self._sample_id = None
+            self._last_sample = None
+            return GLib.SOURCE_REMOVE
+        now = self._now()
+        if now is None:
+            return GLib.SOURCE_CONTINUE
+        elapsed = now - self._last_sample if self._last_sample is not None else None
+        self._last_sample = now
+        output_duration = _frame_duration(self.compositor.get_static_pad('src'))
+
+        for participant_id, pad in self._pads.items():
+            stats = self._stats[participant_id]
+            buffer = pad.get_current_buffer()
+            running_time = to_running_time(pad, buffer.pts) if buffer is not None else None
+            if running_time is None:
+                continue
+            latency_ms = max(now - running_time, 0) / Gst.MSECOND
+            stats.add_latency(latency_ms)
+            if latency_ms > self.late_ms:
+                stats.late += 1
+
+            duration = _frame_duration(pad, buffer)
+            if stats.last_running_time is not None and elapsed and duration and output_duration:
+                stats.frames += max(running_time - stats.last_running_time, 0) / duration
+                stats.output_frames += elapsed / output_duration
+            stats.last_running_time = running_time
+        return GLib.SOURCE_CONTINUE
+
+
+def _frame_duration(pad, buffer=None):
+    # From the buffer if it has one, from the framerate of the pad caps otherwise
+    if buffer is not None and buffer.duration != Gst.CLOCK_TIME_NONE and buffer.duration:
+        return buffer.duration
+    caps = pad.get_current_caps()
+    if caps is None or caps.is_empty():
+        return None
+    ok, num, den = caps.get_structure(0).get_fraction('framerate')
+    if not ok or num <= 0:
+        return None
+    return Gst.SECOND * den // num
@@ -0,0 +1,201 @@
+"""
+Layout helpers shared by the compositor examples.
+
+`layout_tiles()` returns the tile rectangles for a layout type, a participant
+count and a canvas size. Results are memoized, so joins and leaves that bring
+the room back to a size it had before reuse the table instead of recomputing
+it. The layouts are:
+
+- GRID: an auto-sized grid (or `num_cols` columns) of tiles with the canvas
+  aspect ratio, centered on the canvas, with the last row centered
+- SPEAKER: the first tile large on top, the others in a filmstrip below it
+- PIP: the first tile full canvas, the others small in rows from the bottom
+  right corner up, shrunk when they don't all fit
+
+Tiles are (xpos, ypos, width, height, zorder) tuples, the first tile is the
+main one in speaker and picture-in-picture layouts. The layout engine also
+accepts an alpha value as a sixth element, used to hide parked participants.
+`grid_tiles()` is the plain fixed-size grid of the original examples.
+
+`LayoutEngine` applies tiles to the compositor sink pads. The engine
+remembers the geometry it last applied to each pad and only sets the
+properties that actually changed. While the pipeline is playing, the changes
+are applied together from a one-shot probe on the compositor src pad, i.e. on
+the compositor's streaming thread right after it pushed a frame, so the next
+output frame already has the complete new layout instead of a half-moved one.
+"""
+
+import functools
+import math
+import threading
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# Compositor sink pad properties making up a tile, in tile tuple order
+PAD_PROPERTIES = ('xpos', 'ypos', 'width', 'height', 'zorder', 'alpha')
+
+# Layout types
+GRID = 'grid'
+SPEAKER = 'speaker'
+PIP = 'pip'
+LAYOUTS = (GRID, SPEAKER, PIP)
+
+# Share of the canvas height used by the main tile in the speaker layout
+SPEAKER_HEIGHT = 0.75
+# Size of the picture-in-picture tiles relative to the canvas, and their margin
+PIP_SCALE = 0.25
+PIP_MARGIN = 16
+
+
+def grid_tiles(count, num_cols=4, tile_size=320):
+    """Return (xpos, ypos, width, height) for `count` tiles in a grid, row by row."""
+    return [(tile_size * (i % num_cols), tile_size * (i // num_cols), tile_size, tile_size)
+            for i in range(count)]
+
+
+@functools.lru_cache(maxsize=1024)
+def layout_tiles(kind, count, width, height, num_cols=None):
+    """Return the tiles of `count` participants on a width x height canvas, memoized."""
+    if count == 0:
+        return ()
+    if kind == GRID:
+        return _grid(count, 0, 0, width, height, num_cols)
+    if kind == SPEAKER:
+        return _speaker(count, width, height)
+    if kind == PIP:
+        return _pip(count, width, height)
+    raise ValueError(f'unknown layout {kind!r}')
+
+
+def _grid(count, x0, y0, width, height, num_cols=None, zorder=0):
+    cols = min(num_cols or math.ceil(math.sqrt(count)), count)
+    rows = math.ceil(count / cols)
+    # Tiles keep the canvas aspect ratio, the grid is centered in what they leave free
+    tile_width = min(width // cols, height // rows * width // height)
+    tile_height = tile_width * height // width
+    top = y0 + (height - rows * tile_height) // 2
+    tiles = []
+    for i in range(count):
+        row, col = divmod(i, cols)
+        # Center the last row when it isn't full
+        in_row = min(cols, count - row * cols)
+        offset = (width - in_row * tile_width) // 2
+        tiles.append((x0 + offset + col * tile_width, top + row * tile_height,
+                      tile_width, tile_height, zorder + i))
+    return tuple(tiles)
+
+
+def _speaker(count, width, height):
+    if count == 1:
+        return ((0, 0, width, height, 0),)
+    main_height = int(height * SPEAKER_HEIGHT)
+    main_width = main_height * width // height
+    main = ((width - main_width) // 2, 0, main_width, main_height, 0)
+
+    # Filmstrip: one row under the main tile, tiles keep the canvas aspect ratio
+    strip_height = height - main_height
+    others = count - 1
+    tile_width = min(width // others, strip_height * width // height)
+    tile_height = min(strip_height, tile_width * height // width)
+    x0 = (width - others * tile_width) // 2
+    return (main,) + tuple((x0 + i * tile_width, main_height, tile_width, tile_height, i + 1)
+                           for i in range(others))
+
+
+def _pip(count, width, height):
+    main = (0, 0, width, height, 0)
+    others = count - 1
+    # Rows of thumbnails from the bottom up, shrunk when they don't all fit on the canvas
+    tile_width = int(width * PIP_SCALE)
+    while True:
+        tile_height = tile_width * height // width
+        per_row = max((width - PIP_MARGIN) // (tile_width + PIP_MARGIN), 1)
+        rows = math.ceil(others / per_row)
+        if rows * (tile_height + PIP_MARGIN) <= height - PIP_MARGIN or tile_width <= PIP_MARGIN:
+            break
+        tile_width = tile_width * 9 // 10
+    tiles = [main]
+    # Right to left along the bottom edge, above the main tile
+    for i in range(others):
+        row, col = divmod(i, per_row)
+        x = width - (col + 1) * (tile_width + PIP_MARGIN)
+        y = height - (row + 1) * (tile_height + PIP_MARGIN)
+        tiles.append((x, y, tile_width, tile_height, i + 1))
+    return tuple(tiles)
+
+
+class LayoutEngine:
+    """Apply tile geometry to compositor sink pads, touching only what changed."""
+
+    def __init__(self, compositor):
+        self.compositor = compositor
+        self._geometry = {}  # pad -> tile last requested for it
+        self._pending = {}   # pad -> {property: value} not applied yet
+        self._probe_id = None
+        self._lock = threading.Lock()
+
+    def apply(self, targets):
+        """Diff (pad, tile) pairs against the current layout and apply the changes.
+
+        Pads the engine has not seen yet are placed immediately, as they have
+        not received any frame. Changes to the other pads are batched so the
+        compositor picks them up in the same output frame. Returns the number
+        of pad properties that were changed.
+        """
+        changed = 0
+        with self._lock:
+            for pad, tile in targets:
+                current = self._geometry.get(pad)
+                self._geometry[pad] = tile
+
+                if current is None:
+                    for name, value in zip(PAD_PROPERTIES, tile):
+                        pad.set_property(name, value)
+                    changed += len(tile)
+                    continue
+
+                if current == tile:
+                    continue
+                props = self._pending.setdefault(pad, {})
+                for i, (name, new) in enumerate(zip(PAD_PROPERTIES, tile)):
+                    # Tiles may be longer than the one applied before, e.g. with alpha added
+                    if i >= len(current) or current[i] != new:
+                        props[name] = new
+                        changed += 1
+
+            if self._pending and self._probe_id is None:
+                if self._is_streaming():
+                    srcpad = self.compositor.get_static_pad('src')
+                    self._probe_id = srcpad.add_probe(Gst.PadProbeType.BUFFER, self._probe_cb)
+                else:
+                    self._flush_locked()
+        return changed
+
+    def forget(self, pad):
+        """Drop a pad that was released from the compositor."""
+        with self._lock:
+            self._geometry.pop(pad, None)
+            self._pending.pop(pad, None)
+
+    def geometry(self, pad):
+        """Return the tile last requested for a pad, or None."""
+        return self._geometry.get(pad)
+
+    def _is_streaming(self):
+        _, state, _ = self.compositor.get_state(0)
+        return state == Gst.State.PLAYING
+
+    def _flush_locked(self):
+        for pad, props in self._pending.items():
+            for name, value in props.items():
+                pad.set_property(name, value)
+        self._pending.clear()
+
+    def _probe_cb(self, pad, info):
+        # Runs on the compositor streaming thread between two output frames
+        with self._lock:
+            self._flush_locked()
+            self._probe_id = None
+        return Gst.PadProbeReturn.REMOVE
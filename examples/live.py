@@ -0,0 +1,115 @@
+"""
+Live-room settings for the compositor.
+
+By default the compositor waits for every sink pad before producing a frame.
+`configure_live()` gives it an explicit latency budget instead: once the
+deadline for an output frame has passed, it composes with whatever it has and
+reuses the last frame of pads that are late or inactive, so end-to-end latency
+stays bounded when participant feeds jitter. This only applies to live
+sources, e.g. `videotestsrc is-live=true`.
+
+`DeadlineMonitor` reports which pads missed each deadline. It listens to the
+aggregator's `samples-selected` signal, emitted once per output frame, and
+counts a miss for every pad whose current frame is still the one it used for
+the previous output frame. A pad capped to a lower framerate on purpose is
+only late once its frame is older than one frame at its own rate.
+"""
+
+import threading
+from collections import deque
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
+# GstVideo provides get_current_buffer() on the compositor sink pads
+from gi.repository import Gst, GstVideo
+
+# Number of recent deadlines with misses kept for reporting
+MISS_HISTORY = 50
+
+
+def configure_live(compositor, latency_ms=40):
+    """Set the latency budget of the compositor and stop it waiting on late pads."""
+    compositor.set_property('latency', latency_ms * Gst.MSECOND)
+    # Start at the first buffer instead of running time 0, which is long past for late joiners
+    Gst.util_set_object_arg(compositor, 'start-time-selection', 'first')
+    # Pads that never received anything don't hold the output back (GStreamer 1.20+)
+    if compositor.find_property('ignore-inactive-pads') is not None:
+        compositor.set_property('ignore-inactive-pads', True)
+
+
+class DeadlineMonitor:
+    """Count, per pad, the output frames composed without a new frame from it."""
+
+    def __init__(self, compositor):
+        self._lock = threading.Lock()
+        self._pads = {}    # pad -> name it is reported under
+        self._last = {}    # pad -> pts of the frame used for the previous output
+        self._changed = {}    # pad -> output pts at which its frame last changed
+        self._intervals = {}  # pad -> frame interval of a framerate-capped pad
+        self._missed = {}  # name -> missed deadlines
+        self._recent = deque(maxlen=MISS_HISTORY)
+        self._deadlines = 0
+
+        compositor.set_property('emit-signals', True)
+        compositor.connect('samples-selected', self._samples_selected_cb)
+
+    def add_pad(self, pad, name=None):
+        """Start watching a compositor sink pad."""
+        with self._lock:
+            self._pads[pad] = str(name) if name is not None else pad.get_name()
+            self._missed.setdefault(self._pads[pad], 0)
+
+    def remove_pad(self, pad):
+        """Stop watching a pad that is being released."""
+        with self._lock:
+            name = self._pads.pop(pad, None)
+            self._last.pop(pad, None)
+            self._changed.pop(pad, None)
+            self._intervals.pop(pad, None)
+            self._missed.pop(name, None)
+
+    def set_max_framerate(self, pad, fps):
+        """Expect a new frame from a pad only every 1/fps seconds, None for every output."""
+        with self._lock:
+            if fps:
+                self._intervals[pad] = Gst.SECOND // fps
+            else:
+                self._intervals.pop(pad, None)
+
+    def snapshot(self):
+        """Return the miss counters and the most recent deadlines that had misses."""
+        with self._lock:
+            return {
+                'deadlines': self._deadlines,
+                'missed': dict(self._missed),
+                'recent': [{'pts_ms': pts, 'missed': names} for pts, names in self._recent],
+            }
+
+    def _samples_selected_cb(self, aggregator, segment, pts, dts, duration, info):
+        # Runs on the compositor streaming thread, once per output frame
+        with self._lock:
+            self._deadlines += 1
+            missed = []
+            for pad, name in self._pads.items():
+                buffer = pad.get_current_buffer()
+                current = buffer.pts if buffer is not None else None
+                if current is not None and current != self._last.get(pad):
+                    self._changed[pad] = pts
+                elif not self._within_interval(pad, pts, duration):
+                    missed.append(name)
+                    self._missed[name] += 1
+                self._last[pad] = current
+            if missed:
+                output_pts = pts // Gst.MSECOND if pts != Gst.CLOCK_TIME_NONE else None
+                self._recent.append((output_pts, missed))
+
+    def _within_interval(self, pad, pts, duration):
+        # A capped pad's frame is still on time until one of its own frame intervals
+        # (plus one output frame, for rounding) has passed since it changed
+        interval = self._intervals.get(pad)
+        changed = self._changed.get(pad)
+        if interval is None or changed is None or pts == Gst.CLOCK_TIME_NONE:
+            return False
+        slack = duration if duration != Gst.CLOCK_TIME_NONE else 0
+        return pts - changed < interval + slack
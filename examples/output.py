@@ -0,0 +1,190 @@
+"""
+Fan-out output stage for the composited frame.
+
+`OutputStage` puts a tee after the compositor and lets any number of consumers
+hang off it, each in its own branch:
+
+- `add_preview()`: a local display sink
+- `add_recording()`: H.264 into a Matroska file
+- `add_rtp()`: H.264 over RTP/UDP, to a localhost port by default
+
+The compositor composites every frame once; the tee hands the same buffer to
+every branch by reference, nothing is copied or recomposited per consumer.
+Every branch starts with its own leaky queue, so it runs on its own thread and
+a slow consumer (an encoder falling behind, a blocked display) drops its own
+frames instead of back-pressuring the compositor. `stats()` reports the queue
+level and the overruns, i.e. dropped frames, of every branch.
+
+Branches can be added and removed while the pipeline is playing. Removal
+follows the IDLE probe pattern of the room: the tee pad is blocked, unlinked
+and released, then EOS is pushed into the branch so muxers can finalize their
+output before the branch is disposed of.
+"""
+
+import logging
+import threading
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from common import disposer
+
+log = logging.getLogger("output")
+
+# Queue properties at the head of every output branch, a dict passed as `queue` overrides them
+OUTPUT_QUEUE = {
+    'max-size-buffers': 4,
+    'max-size-bytes': 0,
+    'max-size-time': 0,
+    'leaky': 'downstream',
+}
+
+# Seconds a removed branch gets to finish writing after EOS
+EOS_TIMEOUT = 5
+
+def make_element(factory, name, **properties):
+    """Create an element, raise ValueError if its plugin is not installed."""
+    element = Gst.ElementFactory.make(factory, name)
+    if element is None:
+        raise ValueError(f'element {factory} is not available')
+    for key, value in properties.items():
+        # Parses enum nicks such as tune=zerolatency like gst-launch does,
+        # a leading underscore allows reserved words such as _async
+        Gst.util_set_object_arg(element, key.lstrip('_').replace('_', '-'), str(value))
+    return element
+
+
+def h264_encoder(name, bitrate):
+    """Return a low-latency x264enc at `bitrate` kbit/s."""
+    return make_element('x264enc', name, tune='zerolatency', speed_preset='ultrafast',
+                        bitrate=bitrate, key_int_max=60)
+
+
+class OutputBranch:
+    """One consumer of the output stage: a leaky queue followed by its elements."""
+
+    def __init__(self, name, elements, queue=None):
+        self.name = name
+        self.bin = Gst.Bin.new(f'output+{name}')
+        self.queue = make_element('queue', f'outqueue+{name}')
+        self.overruns = 0
+        self.teepad = None
+        self.eos = threading.Event()
+
+        properties = dict(OUTPUT_QUEUE)
+        if isinstance(queue, dict):
+            properties.update(queue)
+        for key, value in properties.items():
+            Gst.util_set_object_arg(self.queue, key, str(value))
+        self.queue.connect('overrun', self._overrun_cb)
+
+        elements = [self.queue] + list(elements)
+        for element in elements:
+            self.bin.add(element)
+        for upstream, downstream in zip(elements, elements[1:]):
+            if not upstream.link(downstream):
+                raise ValueError(f'cannot link {upstream.get_name()} to {downstream.get_name()}')
+        self.bin.add_pad(Gst.GhostPad.new('sink', self.queue.get_static_pad('sink')))
+
+        # The last element is the sink, its EOS means everything was written. Sink
+        # bins with request pads (splitmuxsink) have to set `eos` themselves.
+        sinkpad = elements[-1].get_static_pad('sink')
+        if sinkpad is not None:
+            sinkpad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._eos_cb)
+
+    def stats(self):
+        return {
+            'level_buffers': self.queue.get_property('current-level-buffers'),
+            'overruns': self.overruns,
+        }
+
+    def _overrun_cb(self, queue):
+        self.overruns += 1
+
+    def _eos_cb(self, pad, info):
+        if info.get_event().type == Gst.EventType.EOS:
+            self.eos.set()
+        return Gst.PadProbeReturn.OK
+
+
+class OutputStage:
+    """A tee after the compositor feeding preview, recording and network branches."""
+
+    def __init__(self, pipeline, name='output'):
+        self.pipeline = pipeline
+        self.tee = make_element('tee', f'tee+{name}')
+        # Branches come and go, the tee keeps running without any
+        self.tee.set_property('allow-not-linked', True)
+        pipeline.add(self.tee)
+        self.branches = {}
+
+    def add_branch(self, name, elements, queue=None):
+        """Add a branch of `elements` (ending in a sink) behind its own leaky queue."""
+        if name in self.branches:
+            raise ValueError(f'output {name} already exists')
+        branch = OutputBranch(name, elements, queue)
+        self.pipeline.add(branch.bin)
+        branch.teepad = self.tee.get_request_pad('src_%u')
+        branch.teepad.link(branch.bin.get_static_pad('sink'))
+        self.branches[name] = branch
+        branch.bin.sync_state_with_parent()
+        log.info(f"Added output {name}")
+        return branch
+
+    def remove_branch(self, name, callback=None):
+        """Detach a branch without stopping the others, it finishes writing first.
+
+        `callback(branch)` is called on the dispose thread once the branch is
+        out of the pipeline, whether it finished writing in time or not.
+        """
+        branch = self.branches.pop(name)
+        branch.teepad.add_probe(Gst.PadProbeType.IDLE, self._unlink_cb, branch, callback)
+
+    def add_preview(self, name='preview', sink='autovideosink'):
+        """Show the output in a local window."""
+        return self.add_branch(name, [make_element('videoconvert', f'convert+{name}'),
+                                      make_element(sink, f'sink+{name}')])
+
+    def add_recording(self, location, name='recording', bitrate=4000):
+        """Encode the output to H.264 and write it to a Matroska file."""
+        return self.add_branch(name, [
+            make_element('videoconvert', f'convert+{name}'),
+            h264_encoder(f'encoder+{name}', bitrate),
+            make_element('h264parse', f'parse+{name}'),
+            make_element('matroskamux', f'mux+{name}'),
+            make_element('filesink', f'sink+{name}', location=location, _async=False),
+        ])
+
+    def add_rtp(self, host='127.0.0.1', port=5000, name='rtp', bitrate=2000):
+        """Encode the output to H.264 and send it as RTP over UDP."""
+        return self.add_branch(name, [
+            make_element('videoconvert', f'convert+{name}'),
+            h264_encoder(f'encoder+{name}', bitrate),
+            # Repeat SPS/PPS with every keyframe so receivers can join at any time
+            make_element('rtph264pay', f'pay+{name}', config_interval=-1, pt=96),
+            make_element('udpsink', f'sink+{name}', host=host, port=port, sync=False,
+                         _async=False),
+        ])
+
+    def stats(self):
+        """Return the queue level and dropped frames of every branch."""
+        return {name: branch.stats() for name, branch in self.branches.items()}
+
+    def _unlink_cb(self, pad, info, branch, callback):
+        sinkpad = branch.bin.get_static_pad('sink')
+        pad.unlink(sinkpad)
+        self.tee.release_request_pad(pad)
+        # Can't wait for EOS on the streaming thread of the tee, nor set states from it
+        disposer.submit(self._finish, branch, sinkpad, callback)
+        return Gst.PadProbeReturn.REMOVE
+
+    def _finish(self, branch, sinkpad, callback):
+        sinkpad.send_event(Gst.Event.new_eos())
+        if not branch.eos.wait(EOS_TIMEOUT):
+            log.warning(f"Output {branch.name} did not finish within {EOS_TIMEOUT} s")
+        branch.bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(branch.bin)
+        log.info(f"Removed output {branch.name}")
+        if callback is not None:
+            callback(branch)
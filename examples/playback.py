@@ -0,0 +1,132 @@
+"""
+Buffering, decoding and sink settings for playbin, and playback statistics.
+
+`configure_playbin()` applies the player options:
+
+- buffering: `buffer_size` and `buffer_duration_ms` of the network/queue
+  buffering, `download` for progressive download buffering to disk and
+  `ring_buffer_size` for the in-memory ring buffer used with it
+- decoding: `decoder_threads` sets the thread count of every decoder playbin
+  creates that has one (avdec_* `max-threads`, vpxdec `threads`, dav1ddec
+  `n-threads`), 0 lets the decoder pick
+- the video sink: `sync=False` renders as fast as frames are decoded, which
+  measures raw decode throughput, `qos=False` stops the sink from asking
+  upstream to skip frames when it is late
+
+`PlaybackStats` reports, every interval, the buffering percentage, the rate
+of frames reaching the video sink and of frames it rendered, the frames the
+sink dropped and the buffers dropped through QoS upstream of it, e.g. frames
+decoders skipped, i.e. why a file doesn't play smoothly. Frames skipped
+upstream never reach the sink, so the sink input rate is not the decode rate
+when `qos_dropped` grows. Buffering messages reach it through the bus monitor.
+"""
+
+import json
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+# GstPlayFlags value enabling progressive download buffering
+PLAY_FLAG_DOWNLOAD = 0x80
+
+# Decoder properties holding the number of decoding threads, by decoder family
+DECODER_THREAD_PROPERTIES = ('max-threads', 'threads', 'n-threads')
+
+
+def configure_playbin(playbin, buffer_size=None, buffer_duration_ms=None, download=False,
+                      ring_buffer_size=None, decoder_threads=None, sync=True, qos=True):
+    """Apply buffering, decoder and sink options to a playbin before it starts."""
+    if buffer_size is not None:
+        playbin.set_property('buffer-size', buffer_size)
+    if buffer_duration_ms is not None:
+        playbin.set_property('buffer-duration', buffer_duration_ms * Gst.MSECOND)
+    if download:
+        playbin.set_property('flags', int(playbin.get_property('flags')) | PLAY_FLAG_DOWNLOAD)
+    if ring_buffer_size is not None:
+        playbin.set_property('ring-buffer-max-size', ring_buffer_size)
+
+    def element_setup_cb(playbin, element):
+        # Emitted for every element playbin and its sub-bins create, decoders and sinks included
+        klass = _klass(element)
+        if decoder_threads is not None and 'Decoder' in klass:
+            for name in DECODER_THREAD_PROPERTIES:
+                if element.find_property(name) is not None:
+                    element.set_property(name, decoder_threads)
+                    break
+        if 'Sink' in klass and 'Video' in klass:
+            for name, value in (('sync', sync), ('qos', qos)):
+                if element.find_property(name) is not None:
+                    element.set_property(name, value)
+
+    if decoder_threads is not None or not sync or not qos:
+        playbin.connect('element-setup', element_setup_cb)
+
+
+def _klass(element):
+    factory = element.get_factory()
+    return (factory.get_metadata('klass') or '') if factory is not None else ''
+
+
+class PlaybackStats:
+    """Buffering level, sink input/render framerate and drops of a playbin, every interval."""
+
+    def __init__(self, playbin, monitor):
+        self.playbin = playbin
+        self.monitor = monitor
+        self.buffering = None
+        self._sink = None
+        self._last = None  # (time, rendered, dropped) at the previous report
+        playbin.connect('element-setup', self._element_setup_cb)
+
+    def start(self, interval=1, callback=None):
+        """Report a snapshot every `interval` seconds, printed as JSON by default."""
+        callback = callback or (lambda snapshot: print(json.dumps(snapshot), flush=True))
+        GLib.timeout_add_seconds(interval, self._report_cb, callback)
+
+    def set_buffering(self, percent):
+        """Record the percentage of the last buffering message."""
+        self.buffering = percent
+
+    def snapshot(self):
+        """Return the statistics since the previous snapshot."""
+        now = time.monotonic()
+        rendered = dropped = None
+        if self._sink is not None:
+            sink_stats = self._sink.get_property('stats')
+            rendered = sink_stats.get_value('rendered')
+            dropped = sink_stats.get_value('dropped')
+
+        snapshot = {
+            'buffering_percent': self.buffering,
+            'sink_input_fps': None,
+            'render_fps': None,
+            'dropped_frames': dropped,
+            # Buffers skipped upstream of the sink, e.g. by decoders catching up
+            'qos_dropped': sum(stats.dropped for name, stats in self.monitor.elements.items()
+                               if self._sink is None or name != self._sink.get_name()),
+        }
+        _, position = self.playbin.query_position(Gst.Format.TIME)
+        snapshot['position_s'] = round(position / Gst.SECOND, 2) if position >= 0 else None
+        if self._last is not None and rendered is not None:
+            then, last_rendered, last_dropped = self._last
+            elapsed = now - then
+            if elapsed > 0:
+                # Every frame that reached the sink was rendered or dropped as late
+                arrived = rendered - last_rendered + dropped - last_dropped
+                snapshot['sink_input_fps'] = round(arrived / elapsed, 1)
+                snapshot['render_fps'] = round((rendered - last_rendered) / elapsed, 1)
+        if rendered is not None:
+            self._last = (now, rendered, dropped)
+        return snapshot
+
+    def _element_setup_cb(self, playbin, element):
+        klass = _klass(element)
+        if 'Sink' in klass and 'Video' in klass and element.find_property('stats') is not None:
+            self._sink = element
+
+    def _report_cb(self, callback):
+        callback(self.snapshot())
+        return GLib.SOURCE_CONTINUE
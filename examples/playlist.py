@@ -0,0 +1,128 @@
+"""
+Gapless playlist playback with playbin.
+
+`GaplessPlaylist` plays several files or URIs with one playbin. When playbin
+emits `about-to-finish`, i.e. while the current item is still playing out,
+the next URI is set right away: playbin prerolls it with its decoders already
+set up and switches without tearing down the pipeline, so there are no black
+frames between items.
+
+Every item is reported once its first frame reaches the video sink:
+
+- ttff_ms: time to first frame, for the first item from the start of playback,
+  for the others from the `about-to-finish` handoff of their URI to playbin
+- gap_ms: the gap in running time between the last frame of the previous item
+  and the first frame of this one, 0 when the switch is gapless
+
+Buffers are only looked at around a switch: a buffer probe on the video sink
+is armed on `about-to-finish` and removed after the next item's first frame,
+the rest of the time only stream events are seen by Python. Items without a
+video stream are played but not reported, the item a frame belongs to is
+taken from the URI handed to playbin when its stream starts at the sink.
+"""
+
+import json
+import threading
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+def to_uri(location):
+    """Return a URI for a file name or URI."""
+    return location if Gst.uri_is_valid(location) else Gst.filename_to_uri(location)
+
+
+class GaplessPlaylist:
+    """Queue the items of a playlist on one playbin, and time the switches."""
+
+    def __init__(self, playbin, locations, callback=None):
+        self.playbin = playbin
+        self.uris = [to_uri(location) for location in locations]
+        self.callback = callback or (lambda report: print(json.dumps(report), flush=True))
+        self.reports = []
+        self._current = 0        # item whose stream reached the video sink last
+        self._queued = 0         # last item handed to playbin
+        self._handoffs = {}      # item -> time its URI was handed to playbin
+        self._lock = threading.Lock()
+        self._segment = None
+        self._last_end = None    # running time of the end of the last frame seen
+        self._switch_start = None
+        self._waiting_first_frame = False
+        self._buffer_probe = None
+
+        self.sink = Gst.ElementFactory.make('autovideosink', 'videosink')
+        playbin.set_property('video-sink', self.sink)
+        self._pad = self.sink.get_static_pad('sink')
+        self._pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._event_cb)
+        playbin.connect('about-to-finish', self._about_to_finish_cb)
+
+    def start(self):
+        """Play the first item."""
+        self.playbin.set_property('uri', self.uris[0])
+        with self._lock:
+            self._switch_start = time.monotonic()
+            self._waiting_first_frame = True
+            self._arm()
+        self.playbin.set_state(Gst.State.PLAYING)
+
+    def _about_to_finish_cb(self, playbin):
+        # Runs on a streaming thread, while the current item still plays out
+        with self._lock:
+            if self._queued + 1 >= len(self.uris):
+                return
+            self._queued += 1
+            self._handoffs[self._queued] = time.monotonic()
+            # Track the last frames of the current item for the gap
+            self._arm()
+        playbin.set_property('uri', self.uris[self._queued])
+
+    def _arm(self):
+        if self._buffer_probe is None:
+            self._buffer_probe = self._pad.add_probe(Gst.PadProbeType.BUFFER, self._buffer_cb)
+
+    def _event_cb(self, pad, info):
+        event = info.get_event()
+        if event.type == Gst.EventType.SEGMENT:
+            self._segment = event.parse_segment()
+        elif event.type == Gst.EventType.STREAM_START:
+            with self._lock:
+                # The stream of the last URI handed over, earlier ones may have had no video
+                self._current = self._queued
+                handoff = self._handoffs.pop(self._current, None)
+                if not self._waiting_first_frame:
+                    # A new item starts at the sink, the previous one has been rendered
+                    self._switch_start = handoff if handoff is not None else time.monotonic()
+                    self._waiting_first_frame = True
+        return Gst.PadProbeReturn.OK
+
+    def _buffer_cb(self, pad, info):
+        buffer = info.get_buffer()
+        running_time = None
+        if self._segment is not None and buffer.pts != Gst.CLOCK_TIME_NONE:
+            running_time = self._segment.to_running_time(Gst.Format.TIME, buffer.pts)
+            if running_time == Gst.CLOCK_TIME_NONE:
+                running_time = None
+        with self._lock:
+            if not self._waiting_first_frame:
+                # Still the previous item, remember where its last frame ends
+                if running_time is not None:
+                    duration = buffer.duration if buffer.duration != Gst.CLOCK_TIME_NONE else 0
+                    self._last_end = running_time + duration
+                return Gst.PadProbeReturn.OK
+
+            report = {
+                'item': self._current,
+                'uri': self.uris[self._current],
+                'ttff_ms': round((time.monotonic() - self._switch_start) * 1000, 1),
+                'gap_ms': None,
+            }
+            if self._last_end is not None and running_time is not None:
+                report['gap_ms'] = round(max(running_time - self._last_end, 0) / Gst.MSECOND, 1)
+            self._waiting_first_frame = False
+            self._last_end = None
+            self._buffer_probe = None
+        self.reports.append(report)
+        self.callback(report)
+        return Gst.PadProbeReturn.REMOVE
@@ -0,0 +1,131 @@
+"""
+Segmented background recording of the composited output.
+
+`SegmentedRecording` is an output branch (see output.py) that encodes the
+composited frames to H.264 and writes them with `splitmuxsink`, which starts a
+new file whenever a segment reaches `max_time_s` or `max_bytes`. Segments are
+cut on keyframes and, with GStreamer 1.16+, finalized in the background
+(`async-finalize`), so rotating files never stalls the branch, let alone the
+compositor: like every output branch, the recording sits behind its own leaky
+queue.
+
+`start()` and `stop()` add and remove the branch while the pipeline keeps
+playing; stopping finalizes the segment being written. For every finished
+segment the recording reports its size, duration, encoded bitrate and the
+frames its queue dropped while it was being written, to a callback (logged as
+JSON by default) and in `segments`. The report is driven by the element
+messages splitmuxsink posts on the bus, so it needs a running GLib main loop.
+"""
+
+import json
+import logging
+import os
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from output import h264_encoder, make_element
+
+log = logging.getLogger("recording")
+
+
+class SegmentedRecording:
+    """Record the output of an OutputStage into size or time bounded segments."""
+
+    def __init__(self, output, location, max_time_s=60, max_bytes=0, name='segments',
+                 bitrate=4000, callback=None):
+        self.output = output
+        # printf pattern of the segment files, e.g. room-%05d.mp4
+        self.location = location
+        self.max_time_s = max_time_s
+        self.max_bytes = max_bytes
+        self.name = name
+        self.bitrate = bitrate
+        self.callback = callback or (lambda segment: log.info(json.dumps(segment)))
+        self.segments = []
+        self.branch = None
+        self._splitmux = None
+        self._opened = None  # (location, running time, queue overruns)
+        self._stopping = False
+        self._handler = None
+
+    @property
+    def recording(self):
+        return self.branch is not None
+
+    def start(self):
+        """Start writing segments, without pausing the pipeline."""
+        if self.recording:
+            return
+        self._splitmux = make_element('splitmuxsink', f'splitmux+{self.name}')
+        self._splitmux.set_property('location', self.location)
+        self._splitmux.set_property('max-size-time', int(self.max_time_s * Gst.SECOND))
+        self._splitmux.set_property('max-size-bytes', self.max_bytes)
+        if self._splitmux.find_property('async-finalize') is not None:
+            self._splitmux.set_property('async-finalize', True)
+
+        bus = self.output.pipeline.get_bus()
+        bus.add_signal_watch()
+        # Only element messages reach this handler, not every message on the bus
+        self._handler = bus.connect('message::element', self._element_cb)
+
+        self._stopping = False
+        self.branch = self.output.add_branch(self.name, [
+            make_element('videoconvert', f'convert+{self.name}'),
+            h264_encoder(f'encoder+{self.name}', self.bitrate),
+            make_element('h264parse', f'parse+{self.name}'),
+            self._splitmux,
+        ])
+
+    def stop(self):
+        """Finalize the current segment and remove the recording branch."""
+        if not self.recording or self._stopping:
+            return
+        self._stopping = True
+        # Clean up once the branch is gone, also when no segment was open and
+        # splitmuxsink never reported one closed, so the branch hit the EOS timeout
+        self.output.remove_branch(self.name, self._removed)
+
+    def _element_cb(self, bus, message):
+        if message.src is not self._splitmux:
+            return
+        structure = message.get_structure()
+        if structure.get_name() == 'splitmuxsink-fragment-opened':
+            self._opened = (structure.get_string('location'),
+                            structure.get_value('running-time'), self.branch.overruns)
+        elif structure.get_name() == 'splitmuxsink-fragment-closed' and self._opened:
+            self._segment_closed(structure.get_value('running-time'))
+
+    def _segment_closed(self, running_time):
+        location, opened_at, overruns = self._opened
+        self._opened = None
+        duration = (running_time - opened_at) / Gst.SECOND
+        try:
+            size = os.path.getsize(location)
+        except OSError:
+            size = None
+        segment = {
+            'location': location,
+            'bytes': size,
+            'duration_s': round(duration, 2),
+            # File size over media duration: what the encoder produced, not how fast it was written
+            'bitrate_kbps': round(size * 8 / 1000 / duration, 1) if size and duration else None,
+            'dropped_frames': self.branch.overruns - overruns,
+        }
+        self.segments.append(segment)
+        self.callback(segment)
+
+        if self._stopping:
+            # The last segment is on disk, the branch can be disposed of
+            self.branch.eos.set()
+
+    def _removed(self, branch):
+        # Runs on the dispose thread of the output stage
+        bus = self.output.pipeline.get_bus()
+        bus.disconnect(self._handler)
+        bus.remove_signal_watch()
+        self._handler = None
+        self._opened = None
+        self._splitmux = None
+        self.branch = None
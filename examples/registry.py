@@ -0,0 +1,104 @@
+"""
+Participant registry shared by the compositor examples.
+
+Participants are keyed by id and keep direct references to their source
+element, their compositor sink pad and their tile, so that adding, looking up
+and removing a participant never scans a list or parses element names.
+Compositor sink pad slots (the N in `sink_N`) are recycled when a participant
+leaves, so pad names stay bounded by the peak room size instead of growing
+with every join.
+"""
+
+import random
+
+
+class Participant:
+    """A participant in the room and the GStreamer objects that belong to it."""
+
+    def __init__(self, participant_id, src, pad, slot, tile=None):
+        self.id = participant_id
+        # Element linked to the compositor pad: the source, or the bin wrapping it
+        self.src = src
+        self.pad = pad
+        self.slot = slot
+        # (xpos, ypos, width, height, zorder) currently applied to the pad, with
+        # alpha as a sixth element when the room paginates
+        self.tile = tile
+        # ParticipantBranch wrapping the source, if the room builds one
+        self.branch = None
+        # CompositorGroup whose compositor the pad belongs to
+        self.group = None
+        # AudioBranch and its audiomixer sink pad, if the room mixes audio
+        self.audio = None
+        self.audio_pad = None
+
+
+class ParticipantRegistry:
+    """Participants keyed by id, iterated in join order."""
+
+    def __init__(self):
+        # dicts keep insertion order, which is the join order used for layout
+        self._participants = {}
+        # Dense array + index map so that random picks and removals are both O(1)
+        self._ids = []
+        self._index = {}
+        self._free_slots = []
+        self._next_slot = 0
+
+    def __len__(self):
+        return len(self._participants)
+
+    def __contains__(self, participant_id):
+        return participant_id in self._participants
+
+    def __iter__(self):
+        return iter(self._participants.values())
+
+    def get(self, participant_id):
+        """Return the participant with the given id, or None."""
+        return self._participants.get(participant_id)
+
+    def allocate_slot(self):
+        """Return a free compositor sink pad slot, reusing released ones first."""
+        if self._free_slots:
+            return self._free_slots.pop()
+        slot = self._next_slot
+        self._next_slot += 1
+        return slot
+
+    def release_slot(self, slot):
+        """Give a sink pad slot back so the next participant can reuse it."""
+        self._free_slots.append(slot)
+
+    def add(self, participant):
+        """Register a participant, its slot must come from allocate_slot()."""
+        if participant.id in self._participants:
+            raise KeyError(f'participant {participant.id} already registered')
+        self._participants[participant.id] = participant
+        self._index[participant.id] = len(self._ids)
+        self._ids.append(participant.id)
+
+    def remove(self, participant_id, release_slot=True):
+        """Unregister a participant and return it.
+
+        Pass release_slot=False when the compositor pad is released later, and
+        call release_slot() once it is gone so the slot is not handed out twice.
+        """
+        participant = self._participants.pop(participant_id)
+
+        # Swap the last id into the removed position to keep the array dense
+        index = self._index.pop(participant_id)
+        last_id = self._ids.pop()
+        if last_id != participant_id:
+            self._ids[index] = last_id
+            self._index[last_id] = index
+
+        if release_slot:
+            self.release_slot(participant.slot)
+        return participant
+
+    def random_id(self):
+        """Return the id of a random participant, or None if the room is empty."""
+        if not self._ids:
+            return None
+        return random.choice(self._ids)
@@ -0,0 +1,487 @@
+"""
+Hot-plug participant management for a compositor room.
+
+A `Room` owns the participants of one compositor and lets them join and leave
+while the pipeline stays PLAYING:
+
+- Joining adds the participant's branch, requests (or reuses) a compositor
+  sink pad, places the tile before anything flows through it and then syncs
+  only the new branch with the pipeline state. No other element changes state.
+- Leaving blocks the branch's src pad with an IDLE probe, the same pattern as
+  `probe_cb` in add-two-src.py, unlinks it and releases the compositor pad
+  from there. Setting the branch to NULL can block until its streaming thread
+  has stopped, so that part runs on a background thread instead of the GLib
+  main loop.
+
+Join and leave latency are logged and kept in `join_latencies_ms` /
+`leave_latencies_ms`. The optional features of a room are documented in the
+modules implementing them, see `Room`; `stats()` collects what they measure.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+from audio import LEVEL_INTERVAL_MS, AudioBranch, AVSyncMonitor, make_audio_source
+from branch import ParticipantBranch
+from cascade import CompositorGroup, make_cascade
+from common import disposer
+from instrumentation import Instrumentation
+from layout import GRID, LAYOUTS, grid_tiles, layout_tiles
+from live import configure_live
+from registry import Participant, ParticipantRegistry
+
+log = logging.getLogger("room")
+
+# Number of latency samples kept per event type
+LATENCY_HISTORY = 100
+
+
+def make_source(participant_id):
+    """Create the default participant source, a live videotestsrc."""
+    src = Gst.ElementFactory.make("videotestsrc", f'src+{participant_id}')
+    # Live, like a real participant feed, so its timestamps follow the running time
+    # of the pipeline it joins instead of starting over at zero
+    src.set_property('is-live', True)
+    src.set_property('pattern', hash(participant_id) % 25)
+    return src
+
+
+def check_layout(layout_kind):
+    """Raise ValueError unless `layout_kind` is one of the layout types of layout.py."""
+    if layout_kind not in LAYOUTS:
+        raise ValueError(f'unknown layout {layout_kind!r}, expected one of {", ".join(LAYOUTS)}')
+
+
+def check_canvas(canvas):
+    """Raise ValueError unless `canvas` is a (width, height) pair of positive ints."""
+    if (not isinstance(canvas, (list, tuple)) or len(canvas) != 2
+            or not all(type(size) is int and size > 0 for size in canvas)):
+        raise ValueError(f'canvas must be two positive integers, got {canvas!r}')
+
+
+class Room:
+    """Participants of one compositor, added and removed while it keeps playing."""
+
+    def __init__(self, pipeline, compositor, num_cols=None, tile_size=320, instrument=False,
+                 prescale=True, queue=None, live_latency_ms=None, canvas=None,
+                 layout_kind=GRID, groups=None, page_size=None, inactive_fps=None,
+                 tappable=False, audiomixer=None, level_interval_ms=LEVEL_INTERVAL_MS):
+        """Manage the participants of `compositor`, which is already in `pipeline`.
+
+        - num_cols, tile_size: the fixed-size grid used without a canvas (layout.py)
+        - canvas, layout_kind: a fixed output size and its layout type (layout.py)
+        - prescale, queue, inactive_fps, tappable: per-participant branch (branch.py)
+        - live_latency_ms: compositor latency budget and missed deadlines (live.py)
+        - groups: compositing in stages over N sub-compositors (cascade.py)
+        - page_size: only one page of participants visible, see `set_page()`
+        - audiomixer, level_interval_ms: participant audio (audio.py, speaker.py)
+        - instrument: per-participant latency and drops (instrumentation.py)
+        """
+        check_layout(layout_kind)
+        if canvas is not None:
+            check_canvas(canvas)
+        self.pipeline = pipeline
+        self.compositor = compositor
+        self.num_cols = num_cols
+        self.tile_size = tile_size
+        self.prescale = prescale
+        self.queue = queue
+        self.canvas = canvas
+        self.layout_kind = layout_kind
+        self.speaker = None
+        self.page_size = page_size
+        self.page = 0
+        self.inactive_fps = inactive_fps
+        self.tappable = tappable
+        self.audiomixer = audiomixer
+        self.level_interval_ms = level_interval_ms
+        self.framerate_overrides = {}  # participant id -> fps cap, None for uncapped
+        self.participants = ParticipantRegistry()
+        self.join_latencies_ms = deque(maxlen=LATENCY_HISTORY)
+        self.leave_latencies_ms = deque(maxlen=LATENCY_HISTORY)
+        self.instrumentation = Instrumentation(compositor) if instrument else None
+        self._batch_depth = 0
+        self._dirty = set()     # groups to relayout at the end of the batch, None for all
+        self._starting = []     # participants to start at the end of the batch
+        self._left = []         # (slot, group) of pads released, not closed up yet
+        self._left_lock = threading.Lock()
+
+        if canvas is None and layout_kind != GRID:
+            raise ValueError(f'the {layout_kind} layout needs a canvas')
+        if page_size and (canvas is None or groups):
+            raise ValueError('pagination needs a canvas and a single compositor')
+        if groups:
+            if canvas is None or layout_kind != GRID:
+                raise ValueError('cascaded compositing needs a canvas and the grid layout')
+            if live_latency_ms is not None:
+                configure_live(compositor, live_latency_ms)
+            Gst.util_set_object_arg(compositor, 'background', 'black')
+            self.groups = make_cascade(pipeline, compositor, groups, canvas, live_latency_ms)
+        else:
+            self.groups = [CompositorGroup(compositor, canvas, live_latency_ms)]
+
+        self.av_sync = None
+        if audiomixer is not None:
+            if live_latency_ms is not None:
+                # Same budget as the compositor, so neither mixer waits on the other's late pads
+                configure_live(audiomixer, live_latency_ms)
+            self.av_sync = AVSyncMonitor(compositor, audiomixer)
+
+    def output_caps(self):
+        """Return the caps to link the compositor with, None if the output size is free.
+
+        Linking with them pins the output size to the canvas, so joins and
+        leaves never make downstream elements (and encoders) renegotiate.
+        """
+        if self.canvas is None:
+            return None
+        width, height = self.canvas
+        return Gst.Caps.from_string(f'video/x-raw,width={width},height={height}')
+
+    def add_participant(self, participant_id, src=None, audio_src=None):
+        """Add a participant to the playing pipeline and return it."""
+        start = time.monotonic()
+        if src is None:
+            src = make_source(participant_id)
+
+        # The least loaded group takes the participant, so cascaded groups stay balanced
+        group = min(self.groups, key=len)
+        branch = ParticipantBranch(participant_id, src, prescale=self.prescale,
+                                   queue=self.queue, parkable=bool(self.page_size),
+                                   ratelimit=self.inactive_fps is not None,
+                                   tappable=self.tappable)
+        self.pipeline.add(branch.bin)
+
+        # Request a sink pad, reusing a released slot if there is one
+        slot = self.participants.allocate_slot()
+        pad = group.compositor.get_request_pad(f'sink_{slot}')
+
+        participant = Participant(participant_id, branch.bin, pad, slot)
+        participant.branch = branch
+        participant.group = group
+        self.participants.add(participant)
+        group.members[participant_id] = participant
+        # Places the new tile while nothing flows through its pad yet, parks the
+        # participant if it is off the visible page, and shrinks the other tiles
+        # if they have to make room on a fixed canvas
+        self.relayout(group)
+
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._first_buffer_cb, participant_id, start)
+        srcpad = branch.bin.get_static_pad("src")
+        srcpad.link(pad)
+        if self.instrumentation is not None:
+            self.instrumentation.attach(participant_id, pad)
+        if self.audiomixer is not None:
+            self._add_audio(participant, audio_src)
+
+        if self._batch_depth:
+            # Its tile is only known once the batch is laid out
+            self._starting.append(participant)
+        else:
+            self._start(participant)
+        return participant
+
+    def remove_participant(self, participant_id):
+        """Remove a participant without pausing the pipeline."""
+        start = time.monotonic()
+        participant = self.participants.remove(participant_id, release_slot=False)
+        del participant.group.members[participant_id]
+        self.framerate_overrides.pop(participant_id, None)
+        if self.speaker == participant_id:
+            self.speaker = None
+        if self.instrumentation is not None:
+            self.instrumentation.detach(participant_id)
+        srcpad = participant.src.get_static_pad("src")
+        srcpad.add_probe(Gst.PadProbeType.IDLE, self._unlink_cb, participant, start)
+        if participant.audio is not None:
+            self.av_sync.remove_pads(participant_id)
+            audio_srcpad = participant.audio.bin.get_static_pad("src")
+            audio_srcpad.add_probe(Gst.PadProbeType.IDLE, self._unlink_audio_cb, participant)
+
+    def set_layout(self, layout_kind):
+        """Switch to another layout type of layout.py."""
+        check_layout(layout_kind)
+        if self.canvas is None and layout_kind != GRID:
+            raise ValueError(f'the {layout_kind} layout needs a canvas')
+        if len(self.groups) > 1 and layout_kind != GRID:
+            raise ValueError('cascaded compositing only supports the grid layout')
+        self.layout_kind = layout_kind
+        self.relayout()
+
+    def set_speaker(self, participant_id):
+        """Give a participant the main tile of the speaker and PiP layouts."""
+        if participant_id not in self.participants or participant_id == self.speaker:
+            return
+        self.speaker = participant_id
+        self.relayout(self.participants.get(participant_id).group)
+
+    def set_framerate(self, participant_id, fps):
+        """Cap one participant's framerate regardless of the layout, None to uncap it.
+
+        Without an override, participants are capped to `inactive_fps` except the
+        active one: the speaker, or the main tile of the speaker and PiP layouts.
+        In a grid without a speaker nobody is capped.
+        """
+        participant = self.participants.get(participant_id)
+        if participant is None:
+            return
+        self.framerate_overrides[participant_id] = fps
+        self._set_max_framerate(participant, fps)
+
+    def set_volume(self, participant_id, volume):
+        """Set a participant's audio volume, 1.0 is unchanged."""
+        self._audio(participant_id).set_volume(volume)
+
+    def set_mute(self, participant_id, muted):
+        """Mute or unmute a participant's audio."""
+        self._audio(participant_id).set_mute(muted)
+
+    def tap(self, participant_id, frame_tap):
+        """Attach a FrameTap of tap.py to a participant's frames."""
+        if not self.tappable:
+            raise ValueError('the room was created without tappable=True')
+        participant = self.participants.get(participant_id)
+        if participant is None:
+            raise KeyError(f'no participant {participant_id}')
+        frame_tap.attach(participant.branch.tee)
+
+    def set_page(self, page):
+        """Show another page of participants and park the rest.
+
+        Parked participants' frames are dropped at the start of their branch and
+        their pads made transparent, so CPU cost follows the number of visible
+        tiles. `set_speaker()` brings a participant to the first page.
+        """
+        if not self.page_size:
+            raise ValueError('the room is not paginated')
+        self.page = max(page, 0)
+        self.relayout()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Defer relayouts to the end of the block and run them once per group.
+
+        Participants joining within the block only start streaming after that,
+        already on their final tile, so a burst of joins costs one relayout.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                dirty, self._dirty = self._dirty, set()
+                if None in dirty:
+                    self.relayout()
+                else:
+                    for group in self.groups:
+                        if group in dirty:
+                            self.relayout(group)
+                starting, self._starting = self._starting, []
+                for participant in starting:
+                    # Skip participants that already left again within the batch
+                    if participant.id in self.participants:
+                        self._start(participant)
+
+    def relayout(self, group=None):
+        """Move the participants of one group, or all of them, to their tiles.
+
+        The speaker gets the first tile, the others follow in join order.
+        """
+        if self._batch_depth:
+            self._dirty.add(group)
+            return
+        for current in [group] if group is not None else self.groups:
+            ordered = self._ordered(current)
+            visible, parked = self._paginate(ordered)
+            tiles = self._tiles(current, len(visible))
+            targets = []
+            active = self._active(ordered)
+            for participant, tile in zip(visible, tiles):
+                participant.tile = tile
+                participant.branch.set_tile_size(tile[2], tile[3])
+                self._apply_framerate(participant, active)
+                if self.page_size:
+                    self._set_parked(current, participant, False)
+                    tile += (1.0,)
+                targets.append((participant.pad, tile))
+            for participant in parked:
+                self._set_parked(current, participant, True)
+                # Keep the geometry, only hide it
+                targets.append((participant.pad, (participant.tile or (0, 0, 0, 0, 0)) + (0.0,)))
+            current.layout.apply(targets)
+
+    def stats(self):
+        """Return the room statistics as a dict."""
+        def summary(samples):
+            if not samples:
+                return None
+            return {'avg': round(sum(samples) / len(samples), 1), 'max': round(max(samples), 1)}
+
+        stats = {
+            'participants': len(self.participants),
+            'join_latency_ms': summary(self.join_latencies_ms),
+            'leave_latency_ms': summary(self.leave_latencies_ms),
+        }
+        if len(self.groups) > 1:
+            stats['groups'] = [len(group) for group in self.groups]
+        if self.page_size:
+            stats['page'] = self.page
+            stats['visible'] = min(self.page_size, len(self.participants) - self.page * self.page_size)
+        if self.queue:
+            stats['queues'] = {str(participant.id): participant.branch.queue_stats()
+                               for participant in self.participants}
+        if self.instrumentation is not None:
+            stats['instrumentation'] = self.instrumentation.snapshot()
+        deadlines = [group.deadlines.snapshot() for group in self.groups
+                     if group.deadlines is not None]
+        if deadlines:
+            stats['deadlines'] = deadlines[0] if len(deadlines) == 1 else deadlines
+        if self.av_sync is not None:
+            stats['av_sync'] = self.av_sync.snapshot()
+        return stats
+
+    def _tiles(self, group, count):
+        if group.size is not None:
+            return layout_tiles(self.layout_kind, count, *group.size, self.num_cols)
+        return grid_tiles(count, self.num_cols or 4, self.tile_size)
+
+    def _active(self, ordered):
+        if self.speaker in self.participants:
+            return self.speaker
+        if self.layout_kind != GRID and ordered:
+            return ordered[0].id
+        return None
+
+    def _apply_framerate(self, participant, active):
+        if self.inactive_fps is None:
+            return
+        if participant.id in self.framerate_overrides:
+            fps = self.framerate_overrides[participant.id]
+        elif active is None or participant.id == active:
+            fps = None
+        else:
+            fps = self.inactive_fps
+        self._set_max_framerate(participant, fps)
+
+    def _set_max_framerate(self, participant, fps):
+        participant.branch.set_max_framerate(fps)
+        deadlines = participant.group.deadlines
+        if deadlines is not None:
+            # A capped pad gets fewer frames on purpose, only late ones are misses
+            deadlines.set_max_framerate(participant.pad, fps)
+
+    def _paginate(self, ordered):
+        if not self.page_size:
+            return ordered, []
+        # Fall back to the last page when the room shrank below the current one
+        last_page = max(len(ordered) - 1, 0) // self.page_size
+        self.page = min(self.page, last_page)
+        start = self.page * self.page_size
+        end = start + self.page_size
+        return ordered[start:end], ordered[:start] + ordered[end:]
+
+    def _set_parked(self, group, participant, parked):
+        if not participant.branch.set_parked(parked) or group.deadlines is None:
+            return
+        # A parked pad gets no new frames on purpose, it doesn't miss deadlines
+        if parked:
+            group.deadlines.remove_pad(participant.pad)
+        else:
+            group.deadlines.add_pad(participant.pad, participant.id)
+
+    def _ordered(self, group):
+        speaker = group.members.get(self.speaker)
+        if speaker is None:
+            return list(group.members.values())
+        return [speaker] + [p for p in group.members.values() if p is not speaker]
+
+    def _add_audio(self, participant, audio_src):
+        audio = AudioBranch(participant.id, audio_src or make_audio_source(participant.id),
+                            self.level_interval_ms)
+        self.pipeline.add(audio.bin)
+        participant.audio = audio
+        participant.audio_pad = self.audiomixer.get_request_pad('sink_%u')
+        audio_srcpad = audio.bin.get_static_pad("src")
+        audio_srcpad.link(participant.audio_pad)
+        # Compare what both branches hand to their mixer
+        self.av_sync.add_pads(participant.id, participant.src.get_static_pad("src"),
+                              audio_srcpad)
+
+    def _audio(self, participant_id):
+        participant = self.participants.get(participant_id)
+        if participant is None:
+            raise KeyError(f'no participant {participant_id}')
+        if participant.audio is None:
+            raise ValueError('the room was created without an audiomixer')
+        return participant.audio
+
+    def _start(self, participant):
+        group = participant.group
+        if group.deadlines is not None and not participant.branch.parked:
+            group.deadlines.add_pad(participant.pad, participant.id)
+        # Only the new branches change state, the rest of the pipeline keeps playing
+        participant.branch.bin.sync_state_with_parent()
+        if participant.audio is not None:
+            participant.audio.bin.sync_state_with_parent()
+
+    def _first_buffer_cb(self, pad, info, participant_id, start):
+        latency_ms = (time.monotonic() - start) * 1000
+        self.join_latencies_ms.append(latency_ms)
+        log.info(f"Participant {participant_id} joined in {latency_ms:.1f} ms")
+        return Gst.PadProbeReturn.REMOVE
+
+    def _unlink_cb(self, pad, info, participant, start):
+        # Drop whatever the source still pushes, so it sees OK rather than NOT_LINKED
+        pad.add_probe(Gst.PadProbeType.DATA_DOWNSTREAM, lambda *args: Gst.PadProbeReturn.DROP)
+        pad.unlink(participant.pad)
+
+        group = participant.group
+        group.layout.forget(participant.pad)
+        if group.deadlines is not None:
+            group.deadlines.remove_pad(participant.pad)
+        group.compositor.release_request_pad(participant.pad)
+        # Slots are handed out and tiles computed on the main loop, finish there,
+        # together with any other participant that left in the meantime
+        with self._left_lock:
+            self._left.append((participant.slot, group))
+            schedule = len(self._left) == 1
+        if schedule:
+            GLib.idle_add(self._left_cb)
+
+        latency_ms = (time.monotonic() - start) * 1000
+        self.leave_latencies_ms.append(latency_ms)
+        log.info(f"Participant {participant.id} left in {latency_ms:.1f} ms")
+
+        # Can't set the state of the src to NULL from its streaming thread
+        disposer.submit(self._dispose, participant.src)
+        return Gst.PadProbeReturn.REMOVE
+
+    def _unlink_audio_cb(self, pad, info, participant):
+        pad.add_probe(Gst.PadProbeType.DATA_DOWNSTREAM, lambda *args: Gst.PadProbeReturn.DROP)
+        pad.unlink(participant.audio_pad)
+        self.audiomixer.release_request_pad(participant.audio_pad)
+        disposer.submit(self._dispose, participant.audio.bin)
+        return Gst.PadProbeReturn.REMOVE
+
+    def _left_cb(self):
+        with self._left_lock:
+            left, self._left = self._left, []
+        with self.batch():
+            for slot, group in left:
+                self.participants.release_slot(slot)
+                # Close the gap left by the removed tile
+                self.relayout(group)
+        return GLib.SOURCE_REMOVE
+
+    def _dispose(self, src):
+        src.set_state(Gst.State.NULL)
+        self.pipeline.remove(src)
@@ -0,0 +1,357 @@
+"""
+Local HTTP/WebSocket control server for many rooms in one process.
+
+`RoomManager` owns any number of rooms, each its own `Gst.Pipeline` with a
+compositor and a sink, driven through the asyncio control plane of
+control.py. `ControlServer` exposes them over plain HTTP with JSON bodies,
+using only the standard library:
+
+    GET    /rooms                              list the rooms
+    POST   /rooms                              create a room: {"room", "canvas", "layout", "sink"}
+    DELETE /rooms/<room>                       stop and remove a room
+    POST   /rooms/<room>/participants          add a participant: {"participant"}
+    DELETE /rooms/<room>/participants/<id>     remove a participant
+    PUT    /rooms/<room>/layout                change the layout: {"layout", "speaker"}
+    GET    /rooms/<room>/stats                 the room statistics
+    GET    /rooms/<room>/stats/stream          WebSocket, the room statistics every interval
+
+Requests are served on the asyncio loop and only the pipeline changes run on
+the GLib main loop, coalesced per room, so a slow client never blocks the
+pipelines. Each request has a time budget (`timeout_ms`); a request that does
+not complete within it gets a 504 instead of queueing up behind others, and
+still completes in the background. The server binds to localhost by default
+and has no authentication.
+"""
+
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import re
+import struct
+from http import HTTPStatus
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from control import AsyncRoom, call_on_main_loop
+from layout import GRID
+from room import Room, check_canvas, check_layout
+
+log = logging.getLogger("server")
+
+# Time budget of a single request
+REQUEST_TIMEOUT_MS = 500
+# Largest request body accepted
+MAX_BODY = 64 * 1024
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class ManagedRoom:
+    """A room with the pipeline it runs in."""
+
+    def __init__(self, room_id, pipeline, room):
+        self.id = room_id
+        self.pipeline = pipeline
+        self.room = room  # AsyncRoom
+
+
+class RoomManager:
+    """Rooms of this process by id, each in its own pipeline."""
+
+    def __init__(self, sink='fakesink', live_latency_ms=40):
+        self.sink = sink
+        self.live_latency_ms = live_latency_ms
+        self.rooms = {}
+        self._ids = itertools.count(1)
+        self._creating = set()  # ids of the rooms being built
+
+    async def create(self, room_id=None, canvas=(1280, 720), layout=GRID, sink=None):
+        """Create a playing room and return it."""
+        room_id = str(room_id) if room_id is not None else f'room{next(self._ids)}'
+        if room_id in self.rooms or room_id in self._creating:
+            raise ValueError(f'room {room_id} already exists')
+        # Reserve the id while the room is built, a concurrent create of it fails
+        self._creating.add(room_id)
+        try:
+            pipeline, room = await call_on_main_loop(
+                self._build, room_id, tuple(canvas), layout, sink or self.sink)
+        finally:
+            self._creating.discard(room_id)
+        managed = ManagedRoom(room_id, pipeline, AsyncRoom(room))
+        self.rooms[room_id] = managed
+        log.info(f"Created room {room_id}")
+        return managed
+
+    async def delete(self, room_id):
+        """Stop a room and drop it."""
+        managed = self.get(room_id)
+        del self.rooms[room_id]
+        # Stopping joins the streaming threads, keep that off both loops
+        await asyncio.get_running_loop().run_in_executor(
+            None, managed.pipeline.set_state, Gst.State.NULL)
+        log.info(f"Deleted room {room_id}")
+
+    def get(self, room_id):
+        """Return a room, raise KeyError if there is none with that id."""
+        try:
+            return self.rooms[room_id]
+        except KeyError:
+            raise KeyError(f'no room {room_id}') from None
+
+    async def close(self):
+        """Stop all rooms."""
+        for room_id in list(self.rooms):
+            await self.delete(room_id)
+
+    def _build(self, room_id, canvas, layout, sink_factory):
+        pipeline = Gst.Pipeline.new(room_id)
+        compositor = Gst.ElementFactory.make('compositor', f'compositor+{room_id}')
+        sink = Gst.ElementFactory.make(sink_factory, f'sink+{room_id}')
+        if sink is None:
+            raise ValueError(f'no element {sink_factory}')
+        pipeline.add(compositor)
+        pipeline.add(sink)
+        room = Room(pipeline, compositor, live_latency_ms=self.live_latency_ms,
+                    canvas=canvas, layout_kind=layout)
+        compositor.link_filtered(sink, room.output_caps())
+        pipeline.set_state(Gst.State.PLAYING)
+        return pipeline, room
+
+
+class HTTPError(Exception):
+    """An error answered with its status code and message."""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class ControlServer:
+    """HTTP/WebSocket front end of a RoomManager."""
+
+    def __init__(self, manager, host='127.0.0.1', port=8080, timeout_ms=REQUEST_TIMEOUT_MS,
+                 stats_interval=1.0):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.timeout = timeout_ms / 1000
+        self.stats_interval = stats_interval
+        self._server = None
+        self._routes = [
+            ('GET', r'/rooms', self._list_rooms),
+            ('POST', r'/rooms', self._create_room),
+            ('DELETE', r'/rooms/([^/]+)', self._delete_room),
+            ('POST', r'/rooms/([^/]+)/participants', self._add_participant),
+            ('DELETE', r'/rooms/([^/]+)/participants/([^/]+)', self._remove_participant),
+            ('PUT', r'/rooms/([^/]+)/layout', self._set_layout),
+            ('GET', r'/rooms/([^/]+)/stats', self._room_stats),
+        ]
+
+    async def start(self):
+        """Start listening."""
+        self._server = await asyncio.start_server(self._connection_cb, self.host, self.port)
+        log.info(f"Control server listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        """Start listening and serve until cancelled, then stop all rooms."""
+        await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            await self.manager.close()
+
+    async def _connection_cb(self, reader, writer):
+        try:
+            method, path, headers, body = await self._read_request(reader)
+            stream = re.fullmatch(r'/rooms/([^/]+)/stats/stream', path)
+            if method == 'GET' and stream is not None:
+                await self._stream_stats(stream.group(1), headers, reader, writer)
+                return
+            status, payload = await self._dispatch(method, path, body)
+        except HTTPError as error:
+            status, payload = error.status, {'error': str(error)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as error:
+            # E.g. Gst.AddError when two participants with the same id race
+            log.exception(f"Request failed: {error}")
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(error)}
+        self._write_response(writer, status, payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise HTTPError(HTTPStatus.BAD_REQUEST)
+        method, target, _ = request_line
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'bad Content-Length') from None
+        if length > MAX_BODY:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = None
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'body is not JSON') from None
+            if not isinstance(body, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'body is not a JSON object')
+        return method, target.split('?')[0].rstrip('/') or '/', headers, body or {}
+
+    async def _dispatch(self, method, path, body):
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = re.fullmatch(pattern, path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            # The GLib side of a command can't be called back, so a timeout only stops
+            # the wait: the handler still completes, e.g. registers the room it built
+            task = asyncio.ensure_future(handler(body, *match.groups()))
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+            except asyncio.TimeoutError:
+                task.add_done_callback(_log_late)
+                raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, 'request took too long') from None
+            except KeyError as error:
+                raise HTTPError(HTTPStatus.NOT_FOUND, error.args[0]) from None
+            except (ValueError, TypeError) as error:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(error)) from None
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED if allowed else HTTPStatus.NOT_FOUND)
+
+    def _write_response(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        writer.write((f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                      'Content-Type: application/json\r\n'
+                      f'Content-Length: {len(body)}\r\n'
+                      'Connection: close\r\n\r\n').encode('latin-1') + body)
+
+    async def _list_rooms(self, body):
+        return HTTPStatus.OK, {'rooms': list(self.manager.rooms)}
+
+    async def _create_room(self, body):
+        check_layout(body.get('layout', GRID))
+        check_canvas(body.get('canvas', (1280, 720)))
+        managed = await self.manager.create(body.get('room'), body.get('canvas', (1280, 720)),
+                                            body.get('layout', GRID), body.get('sink'))
+        return HTTPStatus.CREATED, {'room': managed.id}
+
+    async def _delete_room(self, body, room_id):
+        await self.manager.delete(room_id)
+        return HTTPStatus.OK, {'room': room_id}
+
+    async def _add_participant(self, body, room_id):
+        if 'participant' not in body:
+            raise ValueError('missing participant')
+        participant_id = str(body['participant'])
+        room = self.manager.get(room_id).room
+        if participant_id in room.room.participants:
+            raise ValueError(f'participant {participant_id} already joined')
+        await room.add(participant_id)
+        return HTTPStatus.CREATED, {'room': room_id, 'participant': participant_id}
+
+    async def _remove_participant(self, body, room_id, participant_id):
+        room = self.manager.get(room_id).room
+        if participant_id not in room.room.participants:
+            raise KeyError(f'no participant {participant_id}')
+        await room.remove(participant_id)
+        return HTTPStatus.OK, {'room': room_id, 'participant': participant_id}
+
+    async def _set_layout(self, body, room_id):
+        room = self.manager.get(room_id).room
+        if 'layout' in body:
+            check_layout(body['layout'])
+            await room.set_layout(body['layout'])
+        if 'speaker' in body:
+            await room.set_speaker(str(body['speaker']))
+        return HTTPStatus.OK, {'room': room_id}
+
+    async def _room_stats(self, body, room_id):
+        return HTTPStatus.OK, await self.manager.get(room_id).room.stats()
+
+    async def _stream_stats(self, room_id, headers, reader, writer):
+        key = headers.get('sec-websocket-key')
+        if headers.get('upgrade', '').lower() != 'websocket' or key is None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'expected a WebSocket upgrade')
+        if room_id not in self.manager.rooms:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f'no room {room_id}')
+        room = self.manager.rooms[room_id].room
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest())
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept.decode()}\r\n\r\n').encode('latin-1'))
+
+        # The client only ever sends a close frame, its end of the stream ends it too
+        closed = asyncio.ensure_future(_wait_closed(reader))
+        try:
+            while not closed.done() and room_id in self.manager.rooms:
+                stats = await asyncio.wait_for(room.stats(), self.timeout)
+                writer.write(_text_frame(json.dumps(stats)))
+                await writer.drain()
+                await asyncio.wait([closed], timeout=self.stats_interval)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as error:
+            # The upgrade was answered already, only end the stream
+            log.exception(f"Stats stream of room {room_id} failed: {error}")
+        finally:
+            closed.cancel()
+            writer.close()
+
+
+def _log_late(task):
+    # Outcome of a request that was answered with a 504
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        log.warning(f"Request failed after its timeout: {task.exception()}")
+    else:
+        log.info("Request completed after its timeout")
+
+
+async def _wait_closed(reader):
+    while True:
+        header = await reader.read(2)
+        if len(header) < 2 or header[0] & 0x0f == 0x8:
+            return
+        length = header[1] & 0x7f
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        # Skip the masking key and the payload
+        await reader.readexactly(length + (4 if header[1] & 0x80 else 0))
+
+
+def _text_frame(text):
+    payload = text.encode()
+    if len(payload) < 126:
+        header = struct.pack('!BB', 0x81, len(payload))
+    elif len(payload) < 1 << 16:
+        header = struct.pack('!BBH', 0x81, 126, len(payload))
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, len(payload))
+    return header + payload
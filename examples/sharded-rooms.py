@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+Many rooms sharded over one worker process per core.
+
+This script starts a supervisor (supervisor.py) with a pool of control-server.py
+workers, creates a number of rooms with a few participants each, and logs the
+aggregated statistics of all workers every 10 seconds. Kill one of the worker
+processes to see its rooms being restored on a restarted worker while the
+other rooms keep running.
+
+Usage:
+    python3 sharded-rooms.py --rooms 16 --participants 4
+    python3 sharded-rooms.py --workers 2 --sink autovideosink
+
+Requirements:
+- GStreamer and the necessary Python bindings (gi.repository) must be installed.
+
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from supervisor import Supervisor
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("main")
+
+async def run_rooms(options):
+    supervisor = Supervisor(options.workers, options.base_port, options.sink)
+    await supervisor.start()
+    try:
+        for i in range(options.rooms):
+            room_id = f'room{i}'
+            worker = await supervisor.create_room(room_id)
+            for participant in range(options.participants):
+                await supervisor.add_participant(room_id, participant)
+            log.info(f"Room {room_id} placed on worker {worker}")
+
+        while True:
+            await asyncio.sleep(10)
+            log.info(json.dumps(await supervisor.stats()))
+    finally:
+        await supervisor.stop()
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes, one per core by default')
+    parser.add_argument('--base-port', type=int, default=8100,
+                        help='port of the first worker, the others use the next ones')
+    parser.add_argument('--rooms', type=int, default=8)
+    parser.add_argument('--participants', type=int, default=4, help='participants per room')
+    parser.add_argument('--sink', default='fakesink', help='sink element of the rooms')
+    options = parser.parse_args(args[1:])
+
+    try:
+        asyncio.run(run_rooms(options))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
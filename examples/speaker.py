@@ -0,0 +1,124 @@
+"""
+Active-speaker selection from the level messages of the participants' audio.
+
+The `level` element in every audio branch (audio.py) measures loudness in the
+pipeline and posts it on the bus. `SpeakerSelector` only listens to element
+messages, smooths the RMS level of each participant, and decides at a low,
+fixed rate (`interval_ms`) who speaks. Nothing runs in Python per buffer, and
+the work per decision is one pass over the participants, so it scales to
+rooms of 50 and more.
+
+Hysteresis keeps the main tile from flickering between participants:
+
+- a participant only counts as speaking above `threshold_db`
+- a challenger has to be `margin_db` louder than the current speaker, and
+  stay so for `hold_ms`, before it takes over
+- after a switch, the speaker keeps the main tile for at least `min_dwell_ms`
+
+The winner is promoted with `Room.set_speaker()`, so it gets the main tile of
+the speaker and picture-in-picture layouts.
+"""
+
+import logging
+import time
+
+import gi
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib
+
+from audio import parse_level
+
+log = logging.getLogger("speaker")
+
+# Weight of a new level message in the smoothed level
+SMOOTHING = 0.3
+# Level assumed for a participant without any message yet, i.e. silence
+SILENCE_DB = -100.0
+
+
+class SpeakerSelector:
+    """Promote the loudest participant to speaker, with hysteresis."""
+
+    def __init__(self, room, interval_ms=500, threshold_db=-45.0, margin_db=6.0,
+                 hold_ms=1000, min_dwell_ms=2000):
+        if room.audiomixer is None:
+            raise ValueError('speaker selection needs a room with an audiomixer')
+        self.room = room
+        self.interval_ms = interval_ms
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.hold = hold_ms / 1000
+        self.min_dwell = min_dwell_ms / 1000
+        self.switches = 0
+        self.levels = {}       # participant id -> smoothed rms in dB
+        self._names = {}       # level element name -> participant id
+        self._challenger = None
+        self._challenger_since = None
+        self._switched_at = 0.0
+        self._bus = None
+        self._handler = None
+        self._timeout_id = None
+
+    def start(self):
+        """Listen to the level messages and start deciding every interval."""
+        self._bus = self.room.pipeline.get_bus()
+        self._bus.add_signal_watch()
+        # Only element messages reach this handler, not every message on the bus
+        self._handler = self._bus.connect('message::element', self._element_cb)
+        self._timeout_id = GLib.timeout_add(self.interval_ms, self._decide_cb)
+
+    def stop(self):
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._bus.disconnect(self._handler)
+            self._bus.remove_signal_watch()
+            self._timeout_id = None
+
+    def _element_cb(self, bus, message):
+        level = parse_level(message)
+        if level is None:
+            return
+        participant_id = self._participant(message.src.get_name())
+        if participant_id is None:
+            return
+        rms = max(level[0], SILENCE_DB)
+        previous = self.levels.get(participant_id, SILENCE_DB)
+        self.levels[participant_id] = previous + SMOOTHING * (rms - previous)
+
+    def _participant(self, name):
+        if name not in self._names:
+            # Once per new participant: find whose level element this is
+            for participant in self.room.participants:
+                if participant.audio is not None and participant.audio.level.get_name() == name:
+                    self._names[name] = participant.id
+                    break
+            else:
+                return None
+        return self._names[name]
+
+    def _decide_cb(self):
+        # Forget participants that left
+        for participant_id in [p for p in self.levels if p not in self.room.participants]:
+            del self.levels[participant_id]
+        self._names = {name: p for name, p in self._names.items() if p in self.levels}
+
+        loudest = max(self.levels, key=self.levels.get, default=None)
+        speaker = self.room.speaker
+        now = time.monotonic()
+        if (loudest is None or loudest == speaker or self.levels[loudest] < self.threshold_db
+                or now - self._switched_at < self.min_dwell):
+            self._challenger = None
+            return GLib.SOURCE_CONTINUE
+        if speaker in self.levels and self.levels[loudest] - self.levels[speaker] < self.margin_db:
+            self._challenger = None
+            return GLib.SOURCE_CONTINUE
+
+        if loudest != self._challenger:
+            self._challenger, self._challenger_since = loudest, now
+        elif now - self._challenger_since >= self.hold:
+            log.info(f"Active speaker {speaker} -> {loudest} ({self.levels[loudest]:.1f} dB)")
+            self.room.set_speaker(loudest)
+            self.switches += 1
+            self._switched_at = now
+            self._challenger = None
+        return GLib.SOURCE_CONTINUE
@@ -0,0 +1,177 @@
+"""
+Pool of pre-warmed standby sources for fast source swaps.
+
+Creating a `videotestsrc` inside a pad probe, as add-two-src.py used to, makes
+every swap pay for element creation, caps negotiation and the first frame while
+the compositor input waits. A `StandbyPool` does that work ahead of time: each
+standby source is already in the pipeline and running, its caps are
+negotiated, and its streaming thread is parked on a blocking probe holding its
+first frame. A swap only links the standby to the compositor pad and removes
+the block, so the held frame flows right away.
+
+The source that was swapped out goes back to the pool if the pool created it
+and there is room for it, otherwise it is set to NULL from the main loop, like
+`dispose_src_cb`. The
+pool is refilled from the main loop as well, never from a streaming thread.
+
+The pool needs fixed `caps`, e.g. the tile caps of the room, and pins every
+standby source to them, so a swap links a source whose caps the compositor
+pad already has and nothing is renegotiated. Sources the pool replaces should
+produce the same caps, otherwise the first swap of each pad renegotiates.
+
+Swap-to-first-frame time is measured for every swap, kept in
+`swap_latencies_ms` and logged as a warning when it exceeds one frame interval
+(at the framerate of the caps, 30 fps if they have none).
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+log = logging.getLogger("standby")
+
+# Number of swap latency samples kept
+LATENCY_HISTORY = 100
+# Framerate assumed for the swap latency warning when the caps have none
+DEFAULT_FRAMERATE = 30
+
+
+class StandbyPool:
+    """Pre-created, pre-negotiated sources waiting to be swapped in."""
+
+    def __init__(self, pipe, caps, size=2, live=False):
+        self.pipe = pipe
+        self.live = live
+        self.size = size
+        self.caps = Gst.Caps.from_string(caps) if isinstance(caps, str) else caps
+        if self.caps is None or not self.caps.is_fixed():
+            raise ValueError(f'standby sources need fixed caps, got {caps}')
+        ok, num, den = self.caps.get_structure(0).get_fraction('framerate')
+        framerate = num / den if ok and num > 0 else DEFAULT_FRAMERATE
+        self.frame_interval_ms = 1000.0 / framerate
+        self.swap_latencies_ms = deque(maxlen=LATENCY_HISTORY)
+        self._lock = threading.Lock()
+        self._ready = deque()  # sources blocked on their first frame
+        self._blocks = {}      # source -> (block probe id, pts of the held frame)
+        self._warming = 0      # sources created but not blocked yet
+        self._own = set()      # sources created by the pool, pinned to its caps
+        self._refill_scheduled = False
+
+    def fill(self):
+        """Create standby sources until the pool is full, call from the main loop."""
+        with self._lock:
+            self._refill_scheduled = False
+            missing = self.size - len(self._ready) - self._warming
+            self._warming += max(missing, 0)
+        for _ in range(missing):
+            self._park(self._make_source())
+        return GLib.SOURCE_REMOVE
+
+    def swap(self, old_src, peer):
+        """Link a standby source to `peer` in place of `old_src` and return it.
+
+        Call this from an IDLE probe on the src pad of `old_src`, after it was
+        unlinked from `peer`. If no standby is ready a new source is created on
+        the spot, which is exactly the slow path the pool is meant to avoid.
+        """
+        start = time.monotonic()
+        with self._lock:
+            src = self._ready.popleft() if self._ready else None
+            probe_id, pts = self._blocks.pop(src, (None, None))
+            self._schedule_refill_locked()
+
+        if src is None:
+            log.warning("Standby pool empty, creating a source during the swap")
+            src = self._make_source()
+            src.get_static_pad("src").link(peer)
+            src.sync_state_with_parent()
+        else:
+            srcpad = src.get_static_pad("src")
+            # Shift the held frame to the current running time so the compositor
+            # does not treat it as late
+            if pts != Gst.CLOCK_TIME_NONE:
+                srcpad.set_offset(self._running_time() - pts)
+            srcpad.link(peer)
+            peer.add_probe(Gst.PadProbeType.BUFFER, self._first_buffer_cb, start)
+            srcpad.remove_probe(probe_id)
+
+        self.recycle(old_src)
+        return src
+
+    def recycle(self, src):
+        """Return an unlinked source to the pool, or dispose of it if the pool is full."""
+        with self._lock:
+            # Sources from elsewhere may have other caps, they are not reused
+            keep = src in self._own and len(self._ready) + self._warming < self.size
+            if keep:
+                self._warming += 1
+        if keep:
+            self._park(src)
+        else:
+            # Can't set the state of the src to NULL from its streaming thread
+            GLib.idle_add(self._dispose_cb, src)
+
+    def _make_source(self):
+        """Create a standby bin: videotestsrc and capsfilter behind a ghost src pad."""
+        bin = Gst.Bin.new(None)
+        src = Gst.ElementFactory.make('videotestsrc')
+        src.props.pattern = random.randint(0, 24)
+        src.props.is_live = self.live
+        capsfilter = Gst.ElementFactory.make('capsfilter')
+        capsfilter.set_property('caps', self.caps)
+        bin.add(src)
+        bin.add(capsfilter)
+        src.link(capsfilter)
+        bin.add_pad(Gst.GhostPad.new('src', capsfilter.get_static_pad('src')))
+        self.pipe.add(bin)
+        with self._lock:
+            self._own.add(bin)
+        return bin
+
+    def _park(self, src):
+        """Block the source on its next frame and start it if it isn't running."""
+        srcpad = src.get_static_pad("src")
+        srcpad.add_probe(Gst.PadProbeType.BLOCK | Gst.PadProbeType.BUFFER,
+                         self._blocked_cb, src)
+        src.sync_state_with_parent()
+
+    def _blocked_cb(self, pad, info, src):
+        # Runs once on the source's streaming thread, which then stays blocked here
+        with self._lock:
+            self._warming -= 1
+            self._blocks[src] = (info.id, info.get_buffer().pts)
+            self._ready.append(src)
+        return Gst.PadProbeReturn.OK
+
+    def _first_buffer_cb(self, pad, info, start):
+        latency_ms = (time.monotonic() - start) * 1000
+        self.swap_latencies_ms.append(latency_ms)
+        if latency_ms > self.frame_interval_ms:
+            log.warning(f"Swap took {latency_ms:.1f} ms, more than one frame "
+                        f"({self.frame_interval_ms:.1f} ms)")
+        return Gst.PadProbeReturn.REMOVE
+
+    def _schedule_refill_locked(self):
+        if not self._refill_scheduled:
+            self._refill_scheduled = True
+            GLib.idle_add(self.fill)
+
+    def _running_time(self):
+        clock = self.pipe.get_clock()
+        if clock is None:
+            return 0
+        return clock.get_time() - self.pipe.get_base_time()
+
+    def _dispose_cb(self, src):
+        with self._lock:
+            self._own.discard(src)
+        src.set_state(Gst.State.NULL)
+        self.pipe.remove(src)
+        return GLib.SOURCE_REMOVE
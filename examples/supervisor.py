@@ -0,0 +1,239 @@
+"""
+Rooms sharded across worker processes.
+
+One process has one GIL and one GLib main loop, so rooms in the same process
+share a single control thread and their pad probe callbacks contend for the
+same lock. `Supervisor` spreads rooms over a pool of worker processes
+instead, each one running control-server.py with its own main loop on its own
+localhost port:
+
+- Placement: a new room goes to the worker with the lowest load, counted as
+  its rooms plus their participants.
+- Restarts: when a worker exits, it is started again on the same port and the
+  rooms it had are created again with their participants and layout, so a
+  crash only interrupts the rooms of that worker.
+- Stats: `stats()` collects the statistics of every room from its worker.
+
+The supervisor keeps the desired state of every room and talks to the
+workers over the HTTP API of server.py.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+
+log = logging.getLogger("supervisor")
+
+# Seconds a starting worker gets to accept connections
+WORKER_START_TIMEOUT = 10
+# Seconds a worker gets to answer one request
+REQUEST_TIMEOUT = 5
+# Delay before restarting a worker that exited, so a crash loop doesn't spin
+RESTART_DELAY = 1.0
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'control-server.py')
+
+
+class WorkerError(Exception):
+    """A worker answered a request with an error, or gave no usable answer."""
+
+    def __init__(self, status, message):
+        super().__init__(f'{status}: {message}')
+        self.status = status
+
+
+class ShardedRoom:
+    """Desired state of a room: its worker, layout and participants."""
+
+    def __init__(self, room_id, worker, layout, speaker=None):
+        self.id = room_id
+        self.worker = worker
+        self.layout = layout
+        self.speaker = speaker
+        self.participants = []
+
+
+class Worker:
+    """A control-server.py process and the rooms placed on it."""
+
+    def __init__(self, index, port, sink):
+        self.index = index
+        self.port = port
+        self.sink = sink
+        self.process = None
+        self.restarts = 0
+        self.rooms = {}  # room id -> ShardedRoom
+
+    @property
+    def load(self):
+        return sum(1 + len(room.participants) for room in self.rooms.values())
+
+    async def start(self):
+        """Start the process and wait until it accepts requests."""
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, '--port', str(self.port), '--sink', self.sink,
+            cwd=os.path.dirname(WORKER_SCRIPT))
+        deadline = asyncio.get_running_loop().time() + WORKER_START_TIMEOUT
+        while True:
+            try:
+                await self.request('GET', '/rooms')
+                return
+            except WorkerError:
+                if self.process.returncode is not None:
+                    raise RuntimeError(f'worker {self.index} exited while starting')
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f'worker {self.index} did not start')
+                await asyncio.sleep(0.1)
+
+    async def request(self, method, path, body=None):
+        """Send one request to the worker and return the decoded JSON answer.
+
+        A worker that refuses the connection (e.g. while it restarts), doesn't
+        answer in time, or dies before it answered completely, raises
+        WorkerError like a worker answering with an error.
+        """
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection('127.0.0.1', self.port), REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise WorkerError(504, f'worker {self.index} did not accept the connection') from None
+        except OSError as error:
+            raise WorkerError(502, f'cannot connect to worker {self.index}: {error}') from None
+        try:
+            payload = json.dumps(body).encode() if body is not None else b''
+            writer.write((f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                          f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n')
+                         .encode('latin-1') + payload)
+            response = await asyncio.wait_for(reader.read(), REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise WorkerError(504, f'worker {self.index} did not answer') from None
+        except OSError as error:
+            # e.g. the connection was reset by a worker crashing mid-request
+            raise WorkerError(502, f'lost connection to worker {self.index}: {error}') from None
+        finally:
+            writer.close()
+
+        head, _, content = response.partition(b'\r\n\r\n')
+        try:
+            status = int(head.split(None, 2)[1])
+            answer = json.loads(content) if content else {}
+        except (IndexError, ValueError):
+            # Empty or cut short, e.g. the worker crashed while answering
+            raise WorkerError(502, f'malformed answer from worker {self.index}') from None
+        if not isinstance(answer, dict):
+            raise WorkerError(502, f'malformed answer from worker {self.index}')
+        if status >= 400:
+            raise WorkerError(status, answer.get('error'))
+        return answer
+
+    def stop(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+
+class Supervisor:
+    """Place rooms on a pool of worker processes and keep the workers running."""
+
+    def __init__(self, workers=None, base_port=8100, sink='fakesink'):
+        count = workers or os.cpu_count() or 1
+        self.workers = [Worker(i, base_port + i, sink) for i in range(count)]
+        self.rooms = {}  # room id -> ShardedRoom
+        self._watchers = []
+
+    async def start(self):
+        """Start all workers and watch them for crashes."""
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+        self._watchers = [asyncio.ensure_future(self._watch(worker)) for worker in self.workers]
+        log.info(f"Started {len(self.workers)} workers")
+
+    async def stop(self):
+        """Stop watching and terminate all workers."""
+        for watcher in self._watchers:
+            watcher.cancel()
+        for worker in self.workers:
+            worker.stop()
+        await asyncio.gather(*(worker.process.wait() for worker in self.workers
+                               if worker.process is not None))
+
+    async def create_room(self, room_id, layout='grid'):
+        """Create a room on the least loaded worker and return that worker's index."""
+        if room_id in self.rooms:
+            raise ValueError(f'room {room_id} already exists')
+        worker = min(self.workers, key=lambda w: w.load)
+        await worker.request('POST', '/rooms', {'room': room_id, 'layout': layout})
+        room = ShardedRoom(room_id, worker, layout)
+        self.rooms[room_id] = worker.rooms[room_id] = room
+        return worker.index
+
+    async def delete_room(self, room_id):
+        """Stop a room on its worker."""
+        room = self.rooms.pop(room_id)
+        del room.worker.rooms[room_id]
+        await room.worker.request('DELETE', f'/rooms/{room_id}')
+
+    async def add_participant(self, room_id, participant_id):
+        room = self.rooms[room_id]
+        await room.worker.request('POST', f'/rooms/{room_id}/participants',
+                                  {'participant': participant_id})
+        room.participants.append(str(participant_id))
+
+    async def remove_participant(self, room_id, participant_id):
+        room = self.rooms[room_id]
+        room.participants.remove(str(participant_id))
+        if room.speaker == str(participant_id):
+            room.speaker = None
+        await room.worker.request('DELETE', f'/rooms/{room_id}/participants/{participant_id}')
+
+    async def set_layout(self, room_id, layout=None, speaker=None):
+        room = self.rooms[room_id]
+        body = {}
+        if layout is not None:
+            room.layout = body['layout'] = layout
+        if speaker is not None:
+            room.speaker = body['speaker'] = str(speaker)
+        await room.worker.request('PUT', f'/rooms/{room_id}/layout', body)
+
+    async def stats(self):
+        """Return the statistics of every room and the load of every worker."""
+        async def room_stats(room):
+            try:
+                return await room.worker.request('GET', f'/rooms/{room.id}/stats')
+            except WorkerError as error:
+                # The worker is restarting
+                return {'error': str(error)}
+
+        rooms = list(self.rooms.values())
+        results = await asyncio.gather(*(room_stats(room) for room in rooms))
+        return {
+            'workers': [{'worker': worker.index, 'pid': worker.process.pid, 'load': worker.load,
+                         'rooms': len(worker.rooms), 'restarts': worker.restarts}
+                        for worker in self.workers],
+            'rooms': {room.id: dict(stats, worker=room.worker.index)
+                      for room, stats in zip(rooms, results)},
+            'participants': sum(len(room.participants) for room in rooms),
+        }
+
+    async def _watch(self, worker):
+        while True:
+            returncode = await worker.process.wait()
+            log.warning(f"Worker {worker.index} exited with {returncode}, restarting it")
+            worker.restarts += 1
+            await asyncio.sleep(RESTART_DELAY)
+            try:
+                await worker.start()
+                await self._restore(worker)
+            except (OSError, RuntimeError, WorkerError) as error:
+                log.error(f"Could not restart worker {worker.index}: {error}")
+
+    async def _restore(self, worker):
+        # Bring the worker's rooms back as they were before the crash
+        for room in list(worker.rooms.values()):
+            await worker.request('POST', '/rooms', {'room': room.id, 'layout': room.layout})
+            for participant_id in room.participants:
+                await worker.request('POST', f'/rooms/{room.id}/participants',
+                                     {'participant': participant_id})
+            if room.speaker is not None:
+                await worker.request('PUT', f'/rooms/{room.id}/layout', {'speaker': room.speaker})
+        log.info(f"Restored {len(worker.rooms)} rooms on worker {worker.index}")
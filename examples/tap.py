@@ -0,0 +1,150 @@
+"""
+Frame tap that hands sampled frames to Python as NumPy arrays, without copying.
+
+A `FrameTap` is a small bin hung off a tee: a leaky one-buffer queue, a
+videorate that samples the frames down to `fps`, a conversion to a packed
+format (a passthrough when the frames already have it) and an appsink. It can
+be attached to the output stage (`tap.attach(output.tee)`) or to a
+participant, see `Room.tap()`.
+
+For every sampled frame the callback gets an array of shape (height, width,
+channels) and the frame's pts. The array is a view of the mapped `Gst.Buffer`,
+not a copy, and only valid during the callback: the buffer is unmapped when it
+returns, so keep `frame.copy()` if you need the pixels later. Only sampled
+frames reach Python, the others are dropped by videorate in the pipeline.
+
+The callback runs on the tap's own streaming thread. If it is slower than the
+sampling rate, the queue in front of the tap drops frames instead of holding
+up the branch it is attached to; `stats()` reports the delivered and dropped
+frames.
+"""
+
+import fractions
+import logging
+
+import numpy as np
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
+from gi.repository import Gst, GstVideo
+
+from common import disposer
+
+log = logging.getLogger("tap")
+
+# Packed formats the tap can deliver, with their number of channels
+CHANNELS = {'GRAY8': 1, 'RGB': 3, 'BGR': 3, 'RGBA': 4, 'BGRA': 4, 'RGBx': 4, 'BGRx': 4}
+
+
+class FrameTap:
+    """Sampled frames of a tee as NumPy views, dropped rather than waited for."""
+
+    def __init__(self, name, callback, fps=1, format='BGRA'):
+        if format not in CHANNELS:
+            raise ValueError(f'format must be one of {", ".join(CHANNELS)}')
+        self.name = name
+        self.callback = callback
+        self.channels = CHANNELS[format]
+        self.delivered = 0
+        self.dropped = 0
+        self.bin = Gst.Bin.new(f'tap+{name}')
+        self._teepad = None
+        self._shape = None  # (caps, height, width, stride) of the last caps seen
+
+        queue = Gst.ElementFactory.make('queue', f'tapqueue+{name}')
+        queue.set_property('max-size-buffers', 1)
+        queue.set_property('max-size-bytes', 0)
+        queue.set_property('max-size-time', 0)
+        Gst.util_set_object_arg(queue, 'leaky', 'downstream')
+        queue.connect('overrun', self._overrun_cb)
+        rate = Gst.ElementFactory.make('videorate', f'taprate+{name}')
+        convert = Gst.ElementFactory.make('videoconvert', f'tapconvert+{name}')
+        capsfilter = Gst.ElementFactory.make('capsfilter', f'tapcaps+{name}')
+        fraction = fractions.Fraction(fps).limit_denominator(1000)
+        capsfilter.set_property('caps', Gst.Caps.from_string(
+            f'video/x-raw,format={format},framerate={fraction.numerator}/{fraction.denominator}'))
+        self.appsink = Gst.ElementFactory.make('appsink', f'tapsink+{name}')
+        # Never block the branch: keep at most one frame and replace it if not pulled yet
+        self.appsink.set_property('max-buffers', 1)
+        self.appsink.set_property('drop', True)
+        self.appsink.set_property('sync', False)
+        # Added to a playing pipeline: don't wait for a preroll that would never complete
+        self.appsink.set_property('async', False)
+        self.appsink.set_property('emit-signals', True)
+        self.appsink.connect('new-sample', self._new_sample_cb)
+
+        # Sample before converting, so only the frames that are delivered get converted
+        elements = [queue, rate, convert, capsfilter, self.appsink]
+        for element in elements:
+            self.bin.add(element)
+        for upstream, downstream in zip(elements, elements[1:]):
+            upstream.link(downstream)
+        self.bin.add_pad(Gst.GhostPad.new('sink', queue.get_static_pad('sink')))
+
+    def attach(self, tee):
+        """Start tapping the frames of a tee, while its pipeline keeps playing."""
+        tee.get_parent().add(self.bin)
+        self._teepad = tee.get_request_pad('src_%u')
+        self._teepad.link(self.bin.get_static_pad('sink'))
+        self.bin.sync_state_with_parent()
+
+    def detach(self):
+        """Stop tapping and dispose of the tap."""
+        if self._teepad is not None:
+            self._teepad.add_probe(Gst.PadProbeType.IDLE, self._unlink_cb)
+
+    def stats(self):
+        return {'delivered': self.delivered, 'dropped': self.dropped}
+
+    def _overrun_cb(self, queue):
+        self.dropped += 1
+
+    def _new_sample_cb(self, appsink):
+        sample = appsink.emit('pull-sample')
+        if sample is None:
+            return Gst.FlowReturn.OK
+        buffer = sample.get_buffer()
+        height, width, stride = self._frame_shape(sample.get_caps(), buffer)
+        ok, mapinfo = buffer.map(Gst.MapFlags.READ)
+        if not ok:
+            return Gst.FlowReturn.OK
+        try:
+            # A view of the mapped memory, rows may be padded to the stride
+            frame = np.ndarray((height, width, self.channels), dtype=np.uint8,
+                               buffer=mapinfo.data, strides=(stride, self.channels, 1))
+            self.callback(frame, buffer.pts)
+            self.delivered += 1
+        except Exception:
+            log.exception(f"Frame tap {self.name} callback failed")
+        finally:
+            buffer.unmap(mapinfo)
+        return Gst.FlowReturn.OK
+
+    def _frame_shape(self, caps, buffer):
+        meta = GstVideo.buffer_get_video_meta(buffer)
+        if self._shape is None or not self._shape[0].is_equal(caps):
+            structure = caps.get_structure(0)
+            width = structure.get_value('width')
+            height = structure.get_value('height')
+            # Default GStreamer stride for packed formats: rows aligned to 4 bytes
+            stride = (width * self.channels + 3) & ~3
+            self._shape = (caps, height, width, stride)
+        _, height, width, stride = self._shape
+        if meta is not None:
+            stride = meta.stride[0]
+        return height, width, stride
+
+    def _unlink_cb(self, pad, info):
+        pad.unlink(self.bin.get_static_pad('sink'))
+        pad.get_parent_element().release_request_pad(pad)
+        self._teepad = None
+        # Can't set the state of the tap from the tee's streaming thread
+        disposer.submit(self._dispose)
+        return Gst.PadProbeReturn.REMOVE
+
+    def _dispose(self):
+        parent = self.bin.get_parent()
+        self.bin.set_state(Gst.State.NULL)
+        if parent is not None:
+            parent.remove(self.bin)